@@ -0,0 +1,85 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16 09:00:00.000000
+
+Tables as they were created by db.create_all() before migrations existed.
+Databases created that way are stamped at this revision on startup.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+ORDER_STATUS = ('PENDING', 'PROCESSING', 'COMPLETED', 'CANCELLED', 'FAILED')
+ORDER_TYPE = ('BUY', 'SELL')
+
+
+def upgrade():
+    op.create_table(
+        'products',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('price', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('stock_quantity', sa.Integer(), nullable=False),
+        sa.Column('min_stock_level', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'stock_movements',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('quantity_change', sa.Integer(), nullable=False),
+        sa.Column('movement_type', sa.String(length=50), nullable=False),
+        sa.Column('reference_id', sa.String(length=100), nullable=True),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'orders',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_number', sa.String(length=50), nullable=False),
+        sa.Column('order_type', sa.Enum(*ORDER_TYPE, name='ordertype'), nullable=False),
+        sa.Column('status', sa.Enum(*ORDER_STATUS, name='orderstatus'), nullable=False),
+        sa.Column('customer_name', sa.String(length=100), nullable=False),
+        sa.Column('customer_email', sa.String(length=100), nullable=True),
+        sa.Column('total_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('order_number')
+    )
+    op.create_table(
+        'order_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('product_name', sa.String(length=100), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('unit_price', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('total_price', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.ForeignKeyConstraint(['order_id'], ['orders.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('order_items')
+    op.drop_table('orders')
+    op.drop_table('stock_movements')
+    op.drop_table('products')
+    sa.Enum(name='orderstatus').drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name='ordertype').drop(op.get_bind(), checkfirst=True)
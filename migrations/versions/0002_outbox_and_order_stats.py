@@ -0,0 +1,58 @@
+"""outbox events and order stats counters
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16 09:05:00.000000
+
+Both tables may already exist on databases that were built with
+db.create_all(), so they are only created when missing.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+ORDER_STATUS = ('PENDING', 'PROCESSING', 'COMPLETED', 'CANCELLED', 'FAILED')
+ORDER_TYPE = ('BUY', 'SELL')
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'outbox_events' not in existing:
+        op.create_table(
+            'outbox_events',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('topic', sa.String(length=100), nullable=False),
+            sa.Column('event_key', sa.String(length=100), nullable=True),
+            sa.Column('payload', sa.JSON(), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('published_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'order_stats' not in existing:
+        # The enum types were created together with the orders table
+        op.create_table(
+            'order_stats',
+            sa.Column('status', postgresql.ENUM(*ORDER_STATUS, name='orderstatus', create_type=False), nullable=False),
+            sa.Column('order_type', postgresql.ENUM(*ORDER_TYPE, name='ordertype', create_type=False), nullable=False),
+            sa.Column('order_count', sa.Integer(), nullable=False),
+            sa.Column('total_amount', sa.Numeric(precision=14, scale=2), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('status', 'order_type')
+        )
+
+
+def downgrade():
+    op.drop_table('order_stats')
+    op.drop_table('outbox_events')
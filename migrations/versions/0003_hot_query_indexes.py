@@ -0,0 +1,53 @@
+"""indexes for the hot query shapes
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16 09:10:00.000000
+
+On PostgreSQL the indexes are built CONCURRENTLY so that the orders and
+stock tables stay writable while the migration runs.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+LOW_STOCK = sa.text('stock_quantity <= min_stock_level')
+PENDING_OUTBOX = sa.text('published_at IS NULL')
+
+# (name, table, columns, partial index predicate)
+INDEXES = [
+    # GET /orders?status=... ORDER BY created_at DESC
+    ('ix_orders_status_created_at', 'orders', ['status', 'created_at'], None),
+    # GET /orders?order_type=...
+    ('ix_orders_order_type', 'orders', ['order_type'], None),
+    # Keyset pagination and exports without filters
+    ('ix_orders_created_at_id', 'orders', ['created_at', 'id'], None),
+    # Items of a page of orders (selectinload) and of a single order
+    ('ix_order_items_order_id', 'order_items', ['order_id'], None),
+    # Movements of a product, newest first
+    ('ix_stock_movements_product_id_created_at', 'stock_movements', ['product_id', 'created_at'], None),
+    # GET /products/low-stock only touches the products below their level
+    ('ix_products_low_stock', 'products', ['id'], LOW_STOCK),
+    # Outbox relay backlog
+    ('ix_outbox_events_pending', 'outbox_events', ['id'], PENDING_OUTBOX),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True,
+                            postgresql_where=where, sqlite_where=where)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
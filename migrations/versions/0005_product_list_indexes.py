@@ -0,0 +1,41 @@
+"""indexes for the product list filters and sorts
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-16 11:00:00.000000
+
+Built CONCURRENTLY on PostgreSQL, like 0003. stock_quantity is deliberately
+not indexed: it changes on every reservation, and each extra index on it
+would be written on every one of those updates.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def name_prefix_expression():
+    # LIKE 'x%' only uses a btree index under non-C collations with text_pattern_ops
+    if op.get_bind().dialect.name == 'postgresql':
+        return sa.text('lower(name) text_pattern_ops')
+    return sa.text('lower(name)')
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_products_name_id', 'products', ['name', 'id'], postgresql_concurrently=True)
+        op.create_index('ix_products_price_id', 'products', ['price', 'id'], postgresql_concurrently=True)
+        op.create_index('ix_products_name_prefix', 'products', [name_prefix_expression()],
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name in ('ix_products_name_prefix', 'ix_products_price_id', 'ix_products_name_id'):
+            op.drop_index(name, table_name='products', postgresql_concurrently=True)
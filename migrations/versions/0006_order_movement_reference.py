@@ -0,0 +1,60 @@
+"""unique order movements, so order events are applied at most once
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 09:00:00.000000
+
+The inventory consumer used to write one movement per order item, so an
+order with the same product on two lines has two rows; those are merged
+into one before the unique index is built. Only the movement types the
+consumer writes for order events are covered: manual adjustments may reuse
+a reference freely.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+ORDER_MOVEMENTS = "movement_type IN ('sale_reservation', 'purchase')"
+
+SAME_GROUP = """
+    FROM stock_movements d
+    WHERE d.reference_id = stock_movements.reference_id
+      AND d.product_id = stock_movements.product_id
+      AND d.movement_type = stock_movements.movement_type
+"""
+
+
+def upgrade():
+    # Fold duplicate rows into the oldest row of their (order, product, type) group
+    op.execute(f"""
+        UPDATE stock_movements
+        SET quantity_change = (SELECT sum(d.quantity_change) {SAME_GROUP})
+        WHERE {ORDER_MOVEMENTS} AND reference_id IS NOT NULL
+          AND (SELECT count(*) {SAME_GROUP}) > 1
+          AND id = (SELECT min(d.id) {SAME_GROUP})
+    """)
+    op.execute(f"""
+        DELETE FROM stock_movements
+        WHERE {ORDER_MOVEMENTS} AND reference_id IS NOT NULL
+          AND id > (SELECT min(d.id) {SAME_GROUP})
+    """)
+
+    with op.get_context().autocommit_block():
+        op.create_index('ux_stock_movements_order_reference', 'stock_movements',
+                        ['reference_id', 'product_id', 'movement_type'], unique=True,
+                        postgresql_concurrently=True,
+                        postgresql_where=sa.text(ORDER_MOVEMENTS), sqlite_where=sa.text(ORDER_MOVEMENTS))
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ux_stock_movements_order_reference', table_name='stock_movements',
+                      postgresql_concurrently=True)
@@ -0,0 +1,51 @@
+"""shard the order stats counters
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 10:00:00.000000
+
+Every order creation upserted the same (pending, order_type) row, which
+serialized concurrent order writes on its lock. Counters are now split
+over shard rows; the existing rows become shard 0.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('order_stats') as batch_op:
+        batch_op.add_column(sa.Column('shard', sa.SmallInteger(), nullable=False, server_default='0'))
+        if op.get_bind().dialect.name == 'postgresql':
+            batch_op.drop_constraint('order_stats_pkey', type_='primary')
+        batch_op.create_primary_key('order_stats_pkey', ['status', 'order_type', 'shard'])
+
+
+def downgrade():
+    # Fold the shards back into one row per counter before restoring the old key
+    op.execute("""
+        UPDATE order_stats
+        SET order_count = (SELECT sum(s.order_count) FROM order_stats s
+                           WHERE s.status = order_stats.status AND s.order_type = order_stats.order_type),
+            total_amount = (SELECT sum(s.total_amount) FROM order_stats s
+                            WHERE s.status = order_stats.status AND s.order_type = order_stats.order_type)
+        WHERE shard = (SELECT min(s.shard) FROM order_stats s
+                       WHERE s.status = order_stats.status AND s.order_type = order_stats.order_type)
+    """)
+    op.execute("""
+        DELETE FROM order_stats
+        WHERE shard > (SELECT min(s.shard) FROM order_stats s
+                       WHERE s.status = order_stats.status AND s.order_type = order_stats.order_type)
+    """)
+    with op.batch_alter_table('order_stats') as batch_op:
+        if op.get_bind().dialect.name == 'postgresql':
+            batch_op.drop_constraint('order_stats_pkey', type_='primary')
+        batch_op.drop_column('shard')
+        batch_op.create_primary_key('order_stats_pkey', ['status', 'order_type'])
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+"""Benchmark the order -> inventory -> orders event loop without Kafka.
+
+Runs the handlers of all three services in one process on top of the
+in-memory broker (KAFKA_BACKEND=memory) and a throwaway SQLite database,
+then reports the throughput of every stage:
+
+    python scripts/benchmark_event_loop.py --orders 5000 --items 3
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Must be configured before the shared modules are imported
+LOG_DIR = tempfile.mkdtemp(prefix='bench-logs-')
+os.environ.setdefault('KAFKA_BACKEND', 'memory')
+os.environ.setdefault('LOG_DIR', LOG_DIR)
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from shared.database import db, init_db, run_migrations
+from shared.kafka_client import kafka_client, Topics
+from shared.models import Product, Order, OrderItem, OrderStatus, OrderType
+from shared.outbox import add_outbox_event, relay_outbox_batch
+from shared.utils import generate_order_number
+from services.inventory.kafka_consumer import handle_order_batch
+from services.orders.kafka_consumer import handle_inventory_batch
+from services.monitor.kafka_monitor import handle_monitoring_message
+
+def create_app(database_path: str) -> Flask:
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{database_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    init_db(app)
+    return app
+
+def seed(products: int, orders: int, items: int, rng: random.Random):
+    """Create products and sell orders, staging ORDER_CREATED in the outbox"""
+    db.session.add_all([
+        Product(name=f'Product {i}', price=10, stock_quantity=orders * items, min_stock_level=10)
+        for i in range(products)
+    ])
+    db.session.commit()
+
+    product_ids = [product.id for product in Product.query.all()]
+    for _ in range(orders):
+        chosen = rng.sample(product_ids, min(items, len(product_ids)))
+        order = Order(
+            order_number=generate_order_number(),
+            order_type=OrderType.SELL,
+            customer_name='Benchmark',
+            total_amount=10 * len(chosen)
+        )
+        db.session.add(order)
+        db.session.flush()
+
+        order_items = [
+            OrderItem(order_id=order.id, product_id=product_id, product_name=f'Product {product_id}',
+                      quantity=1, unit_price=10, total_price=10)
+            for product_id in chosen
+        ]
+        db.session.add_all(order_items)
+
+        add_outbox_event(Topics.ORDER_CREATED, {
+            'order_id': order.id,
+            'order_number': order.order_number,
+            'order_type': order.order_type.value,
+            'customer_name': order.customer_name,
+            'customer_email': None,
+            'total_amount': float(order.total_amount),
+            'order_items': [
+                {
+                    'product_id': item.product_id,
+                    'product_name': item.product_name,
+                    'quantity': item.quantity,
+                    'unit_price': 10.0,
+                    'total_price': 10.0
+                }
+                for item in order_items
+            ],
+            'created_at': order.created_at.isoformat()
+        }, key=str(order.id))
+    db.session.commit()
+
+def timed(label: str, fn, results: list):
+    start = time.perf_counter()
+    count = fn()
+    elapsed = time.perf_counter() - start
+    results.append((label, count, elapsed))
+
+def relay_all() -> int:
+    published = 0
+    while True:
+        batch = relay_outbox_batch()
+        if not batch:
+            return published
+        published += batch
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--items', type=int, default=3, help='items per order')
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=500, help='max records per consumer batch')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-db-')
+    app = create_app(os.path.join(workdir, 'bench.db'))
+
+    def monitor_batch(messages: list):
+        for topic, message in messages:
+            handle_monitoring_message(topic, message, lambda t: None, lambda *a: None)
+
+    def inventory_batch(messages: list):
+        with app.app_context():
+            handle_order_batch(messages)
+
+    def orders_batch(messages: list):
+        with app.app_context():
+            handle_inventory_batch(messages)
+
+    results = []
+    run_migrations(app)
+    with app.app_context():
+        timed('seed orders', lambda: seed(args.products, args.orders, args.items, random.Random(args.seed)) or args.orders, results)
+        timed('outbox relay', relay_all, results)
+
+    timed('inventory handlers', lambda: kafka_client.drain(
+        [Topics.ORDER_CREATED, Topics.ORDER_PROCESSED], 'inventory-service-group', inventory_batch, args.batch_size), results)
+    timed('orders handlers', lambda: kafka_client.drain(
+        [Topics.STOCK_UPDATE, Topics.ORDER_PROCESSED], 'orders-service-group', orders_batch, args.batch_size), results)
+    timed('monitor handlers', lambda: kafka_client.drain(
+        [Topics.ORDER_CREATED, Topics.ORDER_PROCESSED, Topics.STOCK_UPDATE,
+         Topics.HEALTH_CHECK, Topics.SYSTEM_ERROR], 'monitor-service-group', monitor_batch, args.batch_size), results)
+
+    with app.app_context():
+        processing = Order.query.filter(Order.status == OrderStatus.PROCESSING).count()
+
+    print(f"{'stage':<20} {'messages':>10} {'seconds':>10} {'msg/s':>12}")
+    for label, count, elapsed in results:
+        rate = count / elapsed if elapsed else float('inf')
+        print(f"{label:<20} {count:>10} {elapsed:>10.3f} {rate:>12.1f}")
+    print(f"\norders moved to processing: {processing}/{args.orders}")
+
+if __name__ == '__main__':
+    main()
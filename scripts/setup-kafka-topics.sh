@@ -45,6 +45,13 @@ docker exec $KAFKA_CONTAINER kafka-topics --create \
     --replication-factor 1 \
     --if-not-exists
 
+docker exec $KAFKA_CONTAINER kafka-topics --create \
+    --bootstrap-server kafka:29092 \
+    --topic consumer-metrics \
+    --partitions 1 \
+    --replication-factor 1 \
+    --if-not-exists
+
 # List topics
 echo "Created topics:"
 docker exec $KAFKA_CONTAINER kafka-topics --list --bootstrap-server kafka:29092
@@ -1,34 +1,54 @@
-from flask import Flask, request, jsonify
-from flask_migrate import upgrade
-from sqlalchemy import text
+from flask import Blueprint, Flask, request, jsonify
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import case, func, literal_column, select, text, tuple_
 import os
 import sys
-import threading
 
 # Add parent directories to path to import shared modules
 sys.path.append('/app')
 sys.path.append('/app/shared')
 
-from shared.database import db, init_db, get_db_uri
+from shared.database import db, init_db, get_binds, get_db_uri, get_engine_options, read_only, run_migrations
 from shared.models import Product, StockMovement
 from shared.kafka_client import kafka_client, Topics
-from shared.utils import setup_logging, validate_json, health_check_response
-from services.inventory.kafka_consumer import start_kafka_consumer_with_app
+from shared.export import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, stream_export
+from shared.http_cache import collection_etag, conditional_response, make_etag, row_etag
+from shared.json_provider import init_json_provider
+from shared.pagination import COUNT_MODES, InvalidCursor, clamp_limit, count_rows, decode_cursor, encode_cursor
+from shared.product_cache import product_cache
+from shared.serializers import PRODUCT_FIELDS, STOCK_MOVEMENT_FIELDS, row_dicts
+from shared.utils import setup_logging, validate_json, health_check_response, parse_datetime_param, parse_number_param
+from services.inventory.stock import (
+    InsufficientStock, add_stock_movements, apply_stock_changes, lock_products, stock_update_message,
+    stock_update_messages
+)
 
-app = Flask(__name__)
-
-# Configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = get_db_uri('inventory')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Initialize database
-init_db(app)
+bp = Blueprint('inventory', __name__)
 
 # Setup logging
 logger = setup_logging('inventory-service')
 
+# Sort keys of GET /products and the type of their cursor value
+PRODUCT_SORTS = {
+    'id': (Product.id, int),
+    'name': (Product.name, str),
+    'price': (Product.price, Decimal),
+    'stock_quantity': (Product.stock_quantity, int),
+}
+PRODUCT_FIELD_NAMES = [field.key for field in PRODUCT_FIELDS]
+
+MOVEMENT_PERIODS = ('hour', 'day')
+
+# Maximum number of adjustments accepted by POST /products/stock/bulk
+BULK_MAX_STOCK_ADJUSTMENTS = int(os.getenv('BULK_MAX_STOCK_ADJUSTMENTS', '1000'))
+
+MOVEMENT_EXPORT_COLUMNS = [
+    'id', 'product_id', 'quantity_change', 'movement_type', 'reference_id', 'notes', 'created_at'
+]
+
 # API Routes
-@app.route('/health', methods=['GET'])
+@bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     try:
@@ -47,29 +67,125 @@ def health_check():
         {'database': db_status}
     )), 200 if status == "healthy" else 503
 
-@app.route('/products', methods=['GET'])
+@bp.route('/products', methods=['GET'])
+@read_only
 def get_products():
-    """Get all products"""
+    """List products, one page at a time.
+
+    Filters: name (case-insensitive prefix), min_price/max_price and
+    min_stock/max_stock. sort is one of PRODUCT_SORTS, prefixed with '-' for
+    descending order; further pages are read with the opaque next_cursor
+    (keyset on the sort column and id). fields limits each product to a
+    comma-separated subset of its fields. The ETag covers the page, so an
+    unchanged page is answered with 304 when the client sends If-None-Match.
+    """
     try:
-        products = Product.query.all()
-        return jsonify([product.to_dict() for product in products]), 200
+        limit = clamp_limit(request.args.get('limit', type=int, default=50))
+        cursor = request.args.get('cursor')
+        count_mode = request.args.get('count', 'estimated').lower()
+        sort = request.args.get('sort', 'id')
+        name_prefix = request.args.get('name')
+        
+        if count_mode not in COUNT_MODES:
+            return jsonify({'error': f'Invalid count mode: {count_mode}'}), 400
+        
+        descending = sort.startswith('-')
+        sort_name = sort[1:] if descending else sort
+        if sort_name not in PRODUCT_SORTS:
+            return jsonify({'error': f'Invalid sort: {sort}'}), 400
+        sort_column, sort_type = PRODUCT_SORTS[sort_name]
+        
+        fields = PRODUCT_FIELD_NAMES
+        if request.args.get('fields'):
+            fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+            unknown_fields = [field for field in fields if field not in PRODUCT_FIELD_NAMES]
+            if unknown_fields or not fields:
+                return jsonify({'error': f'Invalid fields: {", ".join(unknown_fields)}'}), 400
+        
+        try:
+            min_price = parse_number_param('min_price', Decimal)
+            max_price = parse_number_param('max_price', Decimal)
+            min_stock = parse_number_param('min_stock')
+            max_stock = parse_number_param('max_stock')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        query = Product.query
+        
+        # Apply filters
+        if name_prefix:
+            query = query.filter(func.lower(Product.name).startswith(name_prefix.lower(), autoescape=True))
+        if min_price is not None:
+            query = query.filter(Product.price >= min_price)
+        if max_price is not None:
+            query = query.filter(Product.price <= max_price)
+        if min_stock is not None:
+            query = query.filter(Product.stock_quantity >= min_stock)
+        if max_stock is not None:
+            query = query.filter(Product.stock_quantity <= max_stock)
+        
+        total, total_is_estimate = count_rows(query, count_mode)
+        
+        # The cursor and the ETag need id, the sort column and updated_at even when they aren't requested
+        columns = list(dict.fromkeys([*fields, 'id', sort_name, 'updated_at']))
+        if descending:
+            order = (sort_column.desc(), Product.id.desc())
+        else:
+            order = (sort_column, Product.id)
+        page_query = query.with_entities(*(getattr(Product, column) for column in columns)).order_by(*order)
+        
+        if cursor:
+            try:
+                cursor_sort, cursor_value, cursor_id = decode_cursor(cursor, str, sort_type, int)
+                if cursor_sort != sort:
+                    raise InvalidCursor(f'Invalid cursor for sort {sort}: {cursor}')
+            except InvalidCursor as e:
+                return jsonify({'error': str(e)}), 400
+            sort_key = tuple_(sort_column, Product.id)
+            cursor_key = tuple_(cursor_value, cursor_id)
+            page_query = page_query.filter(sort_key < cursor_key if descending else sort_key > cursor_key)
+        
+        # Fetch one extra row to know whether there is a next page
+        rows = page_query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        etag = make_etag(
+            Product.__tablename__, request.query_string.decode('utf-8'), total,
+            *(f'{row.id}:{row.updated_at}' for row in rows)
+        )
+        
+        def build():
+            last = rows[-1] if rows else None
+            return {
+                'products': [{field: getattr(row, field) for field in fields} for row in rows],
+                'total': total,
+                'total_is_estimate': total_is_estimate,
+                'limit': limit,
+                'next_cursor': encode_cursor(sort, getattr(last, sort_name), last.id) if has_more else None
+            }
+        
+        return conditional_response(etag, build)
     except Exception as e:
         logger.error(f"Error getting products: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/products/<int:product_id>', methods=['GET'])
+@bp.route('/products/<int:product_id>', methods=['GET'])
 def get_product(product_id):
     """Get specific product"""
     try:
-        product = Product.query.get(product_id)
+        product = product_cache.get_product(product_id)
         if not product:
             return jsonify({'error': 'Product not found'}), 404
-        return jsonify(product.to_dict()), 200
+        return conditional_response(
+            row_etag(Product.__tablename__, product['id'], product['updated_at']),
+            lambda: product
+        )
     except Exception as e:
         logger.error(f"Error getting product {product_id}: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/products', methods=['POST'])
+@bp.route('/products', methods=['POST'])
 @validate_json('name', 'price', 'stock_quantity')
 def create_product():
     """Create new product"""
@@ -94,7 +210,7 @@ def create_product():
         logger.error(f"Error creating product: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/products/<int:product_id>', methods=['PUT'])
+@bp.route('/products/<int:product_id>', methods=['PUT'])
 def update_product(product_id):
     """Update product"""
     try:
@@ -113,37 +229,50 @@ def update_product(product_id):
             product.description = data['description']
         if 'price' in data:
             product.price = data['price']
+        threshold_changed = 'min_stock_level' in data and data['min_stock_level'] != product.min_stock_level
         if 'min_stock_level' in data:
             product.min_stock_level = data['min_stock_level']
         
         db.session.commit()
+        product_cache.invalidate(product_id)
+        
+        product_data = product.to_dict()
+        if threshold_changed:
+            # A new threshold can move the product in or out of low stock without a stock change
+            kafka_client.send_message(
+                Topics.STOCK_UPDATE,
+                stock_update_message(
+                    product_data, product.stock_quantity, product.stock_quantity,
+                    {'quantity_change': 0, 'movement_type': 'min_stock_level_change'}
+                ),
+                key=str(product_id)
+            )
         
         logger.info(f"Updated product: {product.name}")
-        return jsonify(product.to_dict()), 200
+        return jsonify(product_data), 200
     except Exception as e:
         db.session.rollback()
         logger.error(f"Error updating product {product_id}: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/products/<int:product_id>/stock', methods=['POST'])
+@bp.route('/products/<int:product_id>/stock', methods=['POST'])
 @validate_json('quantity_change', 'movement_type')
 def update_stock(product_id):
     """Update product stock"""
     try:
-        product = Product.query.get(product_id)
-        if not product:
-            return jsonify({'error': 'Product not found'}), 404
-        
         data = request.get_json()
         quantity_change = int(data['quantity_change'])
         
-        # Check if there's enough stock for negative changes
-        if quantity_change < 0 and product.stock_quantity + quantity_change < 0:
+        # Check and update in one statement, so concurrent changes can't be lost
+        try:
+            product = apply_stock_changes({product_id: quantity_change}).get(product_id)
+        except InsufficientStock:
+            db.session.rollback()
             return jsonify({'error': 'Insufficient stock'}), 400
+        if not product:
+            return jsonify({'error': 'Product not found'}), 404
         
-        # Update stock
-        old_quantity = product.stock_quantity
-        product.stock_quantity += quantity_change
+        old_quantity = product['stock_quantity'] - quantity_change
         
         # Create stock movement record
         stock_movement = StockMovement(
@@ -156,23 +285,19 @@ def update_stock(product_id):
         
         db.session.add(stock_movement)
         db.session.commit()
+        product_cache.invalidate(product_id)
         
         # Send stock update notification via Kafka
-        stock_update_message = {
-            'product_id': product_id,
-            'old_quantity': old_quantity,
-            'new_quantity': product.stock_quantity,
-            'quantity_change': quantity_change,
-            'movement_type': data['movement_type'],
-            'reference_id': data.get('reference_id')
-        }
-        
-        kafka_client.send_message(Topics.STOCK_UPDATE, stock_update_message)
+        kafka_client.send_message(
+            Topics.STOCK_UPDATE,
+            stock_update_message(product, old_quantity, product['stock_quantity'], stock_movement.to_dict()),
+            key=str(product_id)
+        )
         
-        logger.info(f"Updated stock for product {product_id}: {old_quantity} -> {product.stock_quantity}")
+        logger.info(f"Updated stock for product {product_id}: {old_quantity} -> {product['stock_quantity']}")
         
         return jsonify({
-            'product': product.to_dict(),
+            'product': product,
             'stock_movement': stock_movement.to_dict()
         }), 200
         
@@ -183,42 +308,340 @@ def update_stock(product_id):
         logger.error(f"Error updating stock for product {product_id}: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/products/<int:product_id>/movements', methods=['GET'])
+@bp.route('/products/stock/bulk', methods=['POST'])
+@validate_json('adjustments')
+def update_stock_bulk():
+    """Apply many stock adjustments in one transaction.
+
+    The products are locked once, adjustments are checked in request order
+    against the running quantities, and the accepted ones are written with
+    one conditional UPDATE and one multi-row movement insert. Their
+    STOCK_UPDATE events are handed to the async producer after the commit.
+    Invalid adjustments are reported per index; with "atomic": true any
+    failure rejects the whole request.
+    """
+    try:
+        data = request.get_json()
+        adjustments = data['adjustments']
+        atomic = data.get('atomic', False)
+        
+        if not isinstance(atomic, bool):
+            return jsonify({'error': 'atomic must be a boolean'}), 400
+        
+        if not isinstance(adjustments, list) or not adjustments:
+            return jsonify({'error': 'Adjustments must be a non-empty list'}), 400
+        if len(adjustments) > BULK_MAX_STOCK_ADJUSTMENTS:
+            return jsonify({'error': f'At most {BULK_MAX_STOCK_ADJUSTMENTS} adjustments per request'}), 400
+        
+        # Validate every adjustment before touching the database
+        results = [None] * len(adjustments)
+        valid = []
+        for index, adjustment in enumerate(adjustments):
+            try:
+                if not isinstance(adjustment, dict):
+                    raise ValueError('Adjustment must be an object')
+                missing_fields = [
+                    field for field in ('product_id', 'quantity_change', 'movement_type')
+                    if adjustment.get(field) is None
+                ]
+                if missing_fields:
+                    raise ValueError(f'Missing required fields: {", ".join(missing_fields)}')
+                try:
+                    product_id = int(adjustment['product_id'])
+                    quantity_change = int(adjustment['quantity_change'])
+                except (TypeError, ValueError):
+                    raise ValueError('Invalid product_id or quantity_change value')
+                valid.append((index, {
+                    'product_id': product_id,
+                    'quantity_change': quantity_change,
+                    'movement_type': str(adjustment['movement_type']),
+                    'reference_id': adjustment.get('reference_id'),
+                    'notes': adjustment.get('notes')
+                }))
+            except ValueError as e:
+                results[index] = {'index': index, 'status': 'failed', 'error': str(e)}
+        
+        # Lock the products, then check the adjustments against the running quantities
+        stock = lock_products({movement['product_id'] for _, movement in valid})
+        initial_stock = dict(stock)
+        changes = {}
+        accepted = []
+        for index, movement in valid:
+            product_id = movement['product_id']
+            quantity_change = movement['quantity_change']
+            if product_id not in stock:
+                results[index] = {'index': index, 'status': 'failed', 'error': 'Product not found'}
+            elif stock[product_id] + quantity_change < 0:
+                results[index] = {
+                    'index': index,
+                    'status': 'failed',
+                    'error': f'Insufficient stock: available {stock[product_id]}, requested change {quantity_change}'
+                }
+            else:
+                results[index] = {
+                    'index': index,
+                    'status': 'applied',
+                    'product_id': product_id,
+                    'old_quantity': stock[product_id],
+                    'new_quantity': stock[product_id] + quantity_change
+                }
+                stock[product_id] += quantity_change
+                changes[product_id] = changes.get(product_id, 0) + quantity_change
+                accepted.append(movement)
+        
+        failed = len(adjustments) - len(accepted)
+        if not accepted or (atomic and failed):
+            db.session.rollback()
+            if atomic:
+                # Nothing was applied, so don't report lines as applied
+                results = [
+                    result if result['status'] == 'failed' else {'index': result['index'], 'status': 'not_applied'}
+                    for result in results
+                ]
+            return jsonify({'applied': 0, 'failed': failed, 'results': results}), 400
+        
+        try:
+            products = apply_stock_changes(changes)
+        except InsufficientStock:
+            # The products are locked, so this only happens without row locks (e.g. SQLite)
+            db.session.rollback()
+            return jsonify({'error': 'Insufficient stock, stock changed concurrently'}), 409
+        add_stock_movements(accepted)
+        db.session.commit()
+        product_cache.invalidate(*changes)
+        
+        # Non-blocking sends; the producer's linger batches them without a broker round trip here
+        for message in stock_update_messages(initial_stock, accepted, products):
+            kafka_client.send_message(Topics.STOCK_UPDATE, message, key=str(message['product_id']))
+        
+        logger.info(f"Applied {len(accepted)} stock adjustments to {len(changes)} products in bulk ({failed} rejected)")
+        
+        return jsonify({
+            'applied': len(accepted),
+            'failed': failed,
+            'results': results
+        }), 200 if not failed else 207
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error applying stock adjustments in bulk: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/products/<int:product_id>/movements', methods=['GET'])
+@read_only
 def get_stock_movements(product_id):
-    """Get stock movements for a product"""
+    """Get stock movements for a product, newest first.
+
+    since/until bound created_at. Movements are paged with the opaque
+    next_cursor returned by the previous page (keyset on created_at, id).
+    With group_by=hour or group_by=day the net change per period is
+    computed in SQL instead, and pages go back one batch of periods at a time.
+    """
     try:
-        product = Product.query.get(product_id)
-        if not product:
+        limit = clamp_limit(request.args.get('limit', type=int, default=50))
+        cursor = request.args.get('cursor')
+        group_by = request.args.get('group_by')
+        
+        if group_by and group_by not in MOVEMENT_PERIODS:
+            return jsonify({'error': f'Invalid group_by: {group_by}'}), 400
+        
+        try:
+            since = parse_datetime_param('since')
+            until = parse_datetime_param('until')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if not product_cache.get_product(product_id):
             return jsonify({'error': 'Product not found'}), 404
         
-        movements = StockMovement.query.filter_by(product_id=product_id).order_by(StockMovement.created_at.desc()).all()
-        return jsonify([movement.to_dict() for movement in movements]), 200
+        filters = [StockMovement.product_id == product_id]
+        if since:
+            filters.append(StockMovement.created_at >= since)
+        if until:
+            filters.append(StockMovement.created_at < until)
+        
+        if group_by:
+            return get_stock_movement_periods(filters, group_by, limit, cursor)
+        
+        query = (
+            select(*STOCK_MOVEMENT_FIELDS)
+            .where(*filters)
+            .order_by(StockMovement.created_at.desc(), StockMovement.id.desc())
+        )
+        if cursor:
+            try:
+                cursor_created_at, cursor_id = decode_cursor(cursor, datetime, int)
+            except InvalidCursor as e:
+                return jsonify({'error': str(e)}), 400
+            query = query.where(tuple_(StockMovement.created_at, StockMovement.id) < tuple_(cursor_created_at, cursor_id))
+        
+        # Fetch one extra row to know whether there is a next page
+        movements = row_dicts(db.session.execute(query.limit(limit + 1)))
+        has_more = len(movements) > limit
+        movements = movements[:limit]
+        
+        return jsonify({
+            'movements': movements,
+            'limit': limit,
+            'next_cursor': encode_cursor(movements[-1]['created_at'], movements[-1]['id']) if has_more else None
+        }), 200
     except Exception as e:
         logger.error(f"Error getting stock movements for product {product_id}: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/products/low-stock', methods=['GET'])
+def movement_period(unit: str):
+    """Start of the hour or day of a movement's created_at, computed by the database"""
+    if db.engine.dialect.name == 'postgresql':
+        # Inlined (unit is one of MOVEMENT_PERIODS) so GROUP BY matches the selected expression
+        return func.date_trunc(literal_column(f"'{unit}'"), StockMovement.created_at)
+    return func.strftime('%Y-%m-%dT%H:00:00' if unit == 'hour' else '%Y-%m-%dT00:00:00', StockMovement.created_at)
+
+def get_stock_movement_periods(filters: list, unit: str, limit: int, cursor: str = None):
+    """Net, incoming and outgoing stock change per period, newest period first"""
+    if cursor:
+        try:
+            (cursor_period,) = decode_cursor(cursor, datetime)
+        except InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+        # Periods are aligned, so everything before the last period's start is in older periods
+        filters = [*filters, StockMovement.created_at < cursor_period]
+    
+    period = movement_period(unit).label('period_start')
+    rows = db.session.execute(
+        select(
+            period,
+            func.sum(StockMovement.quantity_change).label('net_change'),
+            func.sum(case((StockMovement.quantity_change > 0, StockMovement.quantity_change), else_=0)).label('quantity_in'),
+            func.sum(case((StockMovement.quantity_change < 0, -StockMovement.quantity_change), else_=0)).label('quantity_out'),
+            func.count(StockMovement.id).label('movements')
+        )
+        .where(*filters)
+        .group_by(period)
+        .order_by(period.desc())
+        .limit(limit + 1)
+    )
+    periods = row_dicts(rows)
+    has_more = len(periods) > limit
+    periods = periods[:limit]
+    
+    return jsonify({
+        'group_by': unit,
+        'periods': periods,
+        'limit': limit,
+        'next_cursor': encode_cursor(periods[-1]['period_start']) if has_more else None
+    }), 200
+
+@bp.route('/products/<int:product_id>/movements/export', methods=['GET'])
+@read_only
+def export_product_stock_movements(product_id):
+    """Stream the stock movements of one product as NDJSON or CSV"""
+    if not product_cache.get_product(product_id):
+        return jsonify({'error': 'Product not found'}), 404
+    return export_stock_movements(product_id)
+
+@bp.route('/movements/export', methods=['GET'])
+@read_only
+def export_stock_movements(product_id=None):
+    """Stream stock movements as NDJSON or CSV.
+
+    Filters: since/until on created_at, movement_type and (for the
+    all-products export) product_id. Rows are read with a server-side
+    cursor in chunks, so memory use doesn't grow with the size of the export.
+    """
+    try:
+        export_format = request.args.get('format', 'ndjson').lower()
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'error': f'Invalid format: {export_format}'}), 400
+        
+        try:
+            since = parse_datetime_param('since')
+            until = parse_datetime_param('until')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        product_id = product_id or request.args.get('product_id', type=int)
+        movement_type = request.args.get('movement_type')
+        
+        query = select(StockMovement).order_by(StockMovement.created_at, StockMovement.id)
+        if product_id:
+            query = query.where(StockMovement.product_id == product_id)
+        if movement_type:
+            query = query.where(StockMovement.movement_type == movement_type)
+        if since:
+            query = query.where(StockMovement.created_at >= since)
+        if until:
+            query = query.where(StockMovement.created_at < until)
+        
+        def rows():
+            result = db.session.execute(query.execution_options(yield_per=EXPORT_CHUNK_SIZE)).scalars()
+            for movement in result:
+                yield movement.to_dict()
+        
+        filename = f'product-{product_id}-movements' if product_id else 'stock-movements'
+        return stream_export(rows(), export_format, MOVEMENT_EXPORT_COLUMNS, filename)
+        
+    except Exception as e:
+        logger.error(f"Error exporting stock movements: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/products/low-stock', methods=['GET'])
+@read_only
 def get_low_stock_products():
-    """Get products with low stock levels"""
+    """Get products at or below their minimum stock level.
+
+    Both queries use the predicate of the ix_products_low_stock partial
+    index, which every stock write keeps up to date, so they only read the
+    low-stock rows instead of scanning the products table.
+    """
     try:
-        low_stock_products = Product.query.filter(Product.stock_quantity <= Product.min_stock_level).all()
-        return jsonify([product.to_dict() for product in low_stock_products]), 200
+        low_stock = Product.stock_quantity <= Product.min_stock_level
+        return conditional_response(
+            collection_etag(Product, low_stock),
+            lambda: row_dicts(db.session.execute(select(*PRODUCT_FIELDS).where(low_stock)))
+        )
     except Exception as e:
         logger.error(f"Error getting low stock products: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-def create_tables():
-    """Create database tables"""
-    with app.app_context():
-        try:
-            db.create_all()
-            logger.info("Database tables created successfully")
-        except Exception as e:
-            logger.error(f"Error creating database tables: {e}")
+def create_app():
+    """Create the inventory service WSGI app"""
+    app = Flask(__name__)
+    init_json_provider(app)
+    
+    # Configuration
+    app.config['SQLALCHEMY_DATABASE_URI'] = get_db_uri('inventory')
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = get_engine_options()
+    app.config['SQLALCHEMY_BINDS'] = get_binds('inventory')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    
+    # Initialize database
+    init_db(app)
+    
+    app.register_blueprint(bp)
+    return app
+
+def create_tables(app):
+    """Bring the database schema up to date with the migrations.
+
+    Failures are re-raised, so the migrate role exits non-zero and the
+    container never starts gunicorn on a partial schema.
+    """
+    try:
+        run_migrations(app)
+        logger.info("Database migrations applied successfully")
+    except Exception as e:
+        logger.error(f"Error applying database migrations: {e}")
+        raise
 
 if __name__ == '__main__':
-    # Create tables
-    create_tables()
+    # Development mode: web server and Kafka consumer in one process. In
+    # production the app runs under gunicorn and the consumer in
+    # services.inventory.worker.
+    import threading
+    from services.inventory.kafka_consumer import start_kafka_consumer_with_app
+    
+    app = create_app()
+    create_tables(app)
     
     # Start Kafka consumer in background thread with app context
     consumer_func = start_kafka_consumer_with_app(app)
@@ -1,18 +1,31 @@
 import sys
 import threading
+from collections import defaultdict
 from datetime import datetime
 
+from sqlalchemy.exc import OperationalError
+
 # Add parent directories to path
 sys.path.append('/app')
 sys.path.append('/app/shared')
 
 from shared.kafka_client import kafka_client, Topics
 from shared.database import db
-from shared.models import Product, StockMovement, OrderStatus
+from shared.models import OrderStatus
+from shared.product_cache import product_cache
+from services.inventory.stock import (
+    add_stock_movements, applied_orders, apply_stock_changes, lock_products, stock_update_messages
+)
 from shared.utils import setup_logging
 
 logger = setup_logging('inventory-kafka-consumer')
 
+# Response status of an order whose movements of this type were applied
+ORDER_MOVEMENT_STATUSES = {
+    'sale_reservation': 'stock_reserved',
+    'purchase': 'stock_updated',
+}
+
 def handle_order_message(topic: str, message: dict):
     """Handle order-related messages"""
     try:
@@ -25,108 +38,196 @@ def handle_order_message(topic: str, message: dict):
     except Exception as e:
         logger.error(f"Error handling message from topic {topic}: {e}")
 
+def handle_order_batch(messages: list):
+    """Handle a batch of order-related messages"""
+    order_created_messages = []
+
+    for topic, message in messages:
+        if topic == Topics.ORDER_CREATED:
+            order_created_messages.append(message)
+        elif topic == Topics.ORDER_PROCESSED:
+            handle_order_processed(message)
+        else:
+            logger.warning(f"Unknown topic: {topic}")
+
+    if order_created_messages:
+        handle_order_created_batch(order_created_messages)
+
 def handle_order_created(message: dict):
     """Handle order created event - reserve stock"""
+    handle_order_created_batch([message])
+
+def handle_order_created_batch(messages: list):
+    """Handle a batch of order created events in a single transaction.
+
+    The products referenced by the batch are locked in id order and only
+    their stock quantities are read. Orders are checked against the stock
+    left by the orders before them, then the net change of every product is
+    applied with one conditional UPDATE and all movements are inserted with
+    one statement. Responses are only published after the commit succeeds.
+    Orders that already have movements (a redelivered or re-relayed event)
+    don't touch stock again; their original outcome is re-published, which
+    the orders consumer applies at most once.
+    If the commit fails, the batch is replayed one order at a time so a
+    single bad order cannot block the others. Database connection errors
+    are raised instead, so the consumer redelivers the batch later.
+    """
     try:
-        order_id = message.get('order_id')
-        order_type = message.get('order_type')
-        order_items = message.get('order_items', [])
-        
-        logger.info(f"Processing order created: {order_id} (type: {order_type})")
-        
-        # For buy orders, we need to reserve stock
-        if order_type == 'sell':
-            success = True
-            error_messages = []
-            
-            for item in order_items:
-                product_id = item['product_id']
-                quantity = item['quantity']
-                
-                product = Product.query.get(product_id)
-                if not product:
-                    error_messages.append(f"Product {product_id} not found")
-                    success = False
-                    continue
-                
-                if product.stock_quantity < quantity:
-                    error_messages.append(f"Insufficient stock for product {product_id}: available {product.stock_quantity}, requested {quantity}")
-                    success = False
-                    continue
-                
-                # Reserve stock by reducing quantity
-                product.stock_quantity -= quantity
-                
-                # Create stock movement record
-                stock_movement = StockMovement(
-                    product_id=product_id,
-                    quantity_change=-quantity,
-                    movement_type='sale_reservation',
-                    reference_id=str(order_id),
-                    notes=f"Stock reserved for order {order_id}"
-                )
-                
-                db.session.add(stock_movement)
-            
-            if success:
-                db.session.commit()
-                logger.info(f"Stock reserved successfully for order {order_id}")
-                
-                # Send confirmation message
-                response_message = {
-                    'order_id': order_id,
-                    'status': 'stock_reserved',
-                    'timestamp': datetime.utcnow().isoformat()
-                }
-                kafka_client.send_message(Topics.ORDER_PROCESSED, response_message)
-            else:
-                db.session.rollback()
-                logger.error(f"Failed to reserve stock for order {order_id}: {', '.join(error_messages)}")
-                
-                # Send failure message
-                response_message = {
-                    'order_id': order_id,
-                    'status': 'stock_reservation_failed',
-                    'errors': error_messages,
+        product_ids = {
+            item['product_id']
+            for message in messages
+            for item in message.get('order_items', [])
+        }
+        # Batches for different orders run in parallel workers and may touch
+        # the same products
+        stock = lock_products(product_ids)
+        initial_stock = dict(stock)
+
+        # Checked under the product locks, so a concurrent delivery of the same order sees it committed
+        applied = applied_orders(message.get('order_id') for message in messages)
+
+        responses = []
+        changes = defaultdict(int)
+        movements = []
+        for message in messages:
+            reference_id = str(message.get('order_id'))
+            if reference_id in applied:
+                logger.info("Order %s was already applied, skipping duplicate event", reference_id)
+                responses.append({
+                    'order_id': message.get('order_id'),
+                    'status': ORDER_MOVEMENT_STATUSES[applied[reference_id]],
                     'timestamp': datetime.utcnow().isoformat()
-                }
-                kafka_client.send_message(Topics.ORDER_PROCESSED, response_message)
-        
-        elif order_type == 'buy':
-            # For buy orders, we add stock after processing
-            for item in order_items:
-                product_id = item['product_id']
-                quantity = item['quantity']
-                
-                product = Product.query.get(product_id)
-                if product:
-                    product.stock_quantity += quantity
-                    
-                    # Create stock movement record
-                    stock_movement = StockMovement(
-                        product_id=product_id,
-                        quantity_change=quantity,
-                        movement_type='purchase',
-                        reference_id=str(order_id),
-                        notes=f"Stock added from purchase order {order_id}"
-                    )
-                    
-                    db.session.add(stock_movement)
-            
-            db.session.commit()
-            logger.info(f"Stock added successfully for buy order {order_id}")
-            
-            # Send confirmation message
-            response_message = {
+                })
+                continue
+
+            planned = len(movements)
+            response_message = apply_order_created(message, stock, changes, movements)
+            if response_message:
+                responses.append(response_message)
+            if len(movements) > planned:
+                applied[reference_id] = movements[-1]['movement_type']
+
+        products = apply_stock_changes(changes)
+        add_stock_movements(movements)
+        db.session.commit()
+        product_cache.invalidate(*changes)
+        stock_updates = stock_update_messages(initial_stock, movements, products)
+
+    except OperationalError:
+        db.session.rollback()
+        raise
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error processing batch of {len(messages)} order created messages: {e}")
+
+        if len(messages) > 1:
+            for message in messages:
+                handle_order_created_batch([message])
+        return
+
+    for response_message in responses:
+        kafka_client.send_message(Topics.ORDER_PROCESSED, response_message, key=str(response_message['order_id']))
+
+    # One event per touched product with its final quantity keeps the
+    # low-stock view downstream complete; async sends keep the worker from
+    # waiting on the broker
+    for message in stock_updates:
+        kafka_client.send_message(Topics.STOCK_UPDATE, message, key=str(message['product_id']))
+
+def apply_order_created(message: dict, stock: dict, changes: dict, movements: list):
+    """Plan the stock changes of one order created event.
+
+    stock holds the locked products' quantities and is updated as orders
+    reserve or add stock; the order's net change per product is added to
+    changes and its movement rows to movements. Returns the response
+    message to publish, or None for unknown order types. A sell order is
+    only applied when every item can be reserved, so a failed order never
+    leaves partial reservations in the shared transaction.
+    """
+    order_id = message.get('order_id')
+    order_type = message.get('order_type')
+    order_items = message.get('order_items', [])
+
+    logger.info("Processing order created: %s (type: %s)", order_id, order_type)
+
+    # For sell orders, we need to reserve stock
+    if order_type == 'sell':
+        error_messages = []
+        requested = defaultdict(int)
+
+        for item in order_items:
+            product_id = item['product_id']
+            quantity = item['quantity']
+
+            if product_id not in stock:
+                error_messages.append(f"Product {product_id} not found")
+                continue
+
+            available = stock[product_id] - requested[product_id]
+            if available < quantity:
+                error_messages.append(f"Insufficient stock for product {product_id}: available {available}, requested {quantity}")
+                continue
+
+            requested[product_id] += quantity
+
+        if error_messages:
+            logger.error(f"Failed to reserve stock for order {order_id}: {', '.join(error_messages)}")
+            return {
                 'order_id': order_id,
-                'status': 'stock_updated',
+                'status': 'stock_reservation_failed',
+                'errors': error_messages,
                 'timestamp': datetime.utcnow().isoformat()
             }
-            kafka_client.send_message(Topics.ORDER_PROCESSED, response_message)
-                
-    except Exception as e:
-        db.session.rollback()
-        logger.error(f"Error processing order created message: {e}")
+
+        # Reserve stock by reducing quantity
+        for product_id, quantity in requested.items():
+            stock[product_id] -= quantity
+            changes[product_id] -= quantity
+
+        # One movement per product, as ux_stock_movements_order_reference requires
+        movements.extend({
+            'product_id': product_id,
+            'quantity_change': -quantity,
+            'movement_type': 'sale_reservation',
+            'reference_id': str(order_id),
+            'notes': f"Stock reserved for order {order_id}"
+        } for product_id, quantity in requested.items())
+
+        logger.info("Stock reserved successfully for order %s", order_id)
+        return {
+            'order_id': order_id,
+            'status': 'stock_reserved',
+            'timestamp': datetime.utcnow().isoformat()
+        }
+
+    elif order_type == 'buy':
+        # For buy orders, we add stock after processing
+        received = defaultdict(int)
+        for item in order_items:
+            product_id = item['product_id']
+            quantity = item['quantity']
+
+            if product_id in stock:
+                stock[product_id] += quantity
+                changes[product_id] += quantity
+                received[product_id] += quantity
+
+        movements.extend({
+            'product_id': product_id,
+            'quantity_change': quantity,
+            'movement_type': 'purchase',
+            'reference_id': str(order_id),
+            'notes': f"Stock added from purchase order {order_id}"
+        } for product_id, quantity in received.items())
+
+        logger.info("Stock added successfully for buy order %s", order_id)
+        return {
+            'order_id': order_id,
+            'status': 'stock_updated',
+            'timestamp': datetime.utcnow().isoformat()
+        }
+
+    return None
 
 def handle_order_processed(message: dict):
     """Handle order processed event"""
@@ -134,13 +235,13 @@ def handle_order_processed(message: dict):
         order_id = message.get('order_id')
         status = message.get('status')
         
-        logger.info(f"Order {order_id} processed with status: {status}")
+        logger.info("Order %s processed with status: %s", order_id, status)
         
         # If order was cancelled or failed, we might need to restore reserved stock
         if status in ['cancelled', 'failed']:
             # This would require more complex logic to track reservations
             # For now, just log the event
-            logger.info(f"Order {order_id} was {status}, stock restoration might be needed")
+            logger.info("Order %s was %s, stock restoration might be needed", order_id, status)
             
     except Exception as e:
         logger.error(f"Error processing order processed message: {e}")
@@ -167,11 +268,13 @@ def start_kafka_consumer_with_app(app):
             topics = [Topics.ORDER_CREATED, Topics.ORDER_PROCESSED]
             group_id = 'inventory-service-group'
             
-            def message_handler_with_context(topic: str, message: dict):
+            # Called from the worker threads: each call gets its own app
+            # context and therefore its own DB session
+            def batch_handler_with_context(messages: list):
                 with app.app_context():
-                    handle_order_message(topic, message)
+                    handle_order_batch(messages)
             
-            kafka_client.consume_messages(topics, group_id, message_handler_with_context)
+            kafka_client.consume_partitioned(topics, group_id, batch_handler_with_context)
             
         except Exception as e:
             logger.error(f"Error in Kafka consumer: {e}")
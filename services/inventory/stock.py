@@ -0,0 +1,121 @@
+"""Set-based stock changes.
+
+Stock is never read into Python, modified and written back: every change
+is a conditional UPDATE that only applies if the resulting quantity is not
+negative, so concurrent consumers and HTTP calls can't lose updates or
+oversell. Transactions that change several products lock them in product id
+order first, so they can't deadlock on each other.
+"""
+from sqlalchemy import case, insert, select, update
+
+from shared.database import db
+from shared.models import ORDER_MOVEMENT_TYPES, Product, StockMovement, is_low_stock
+from shared.serializers import PRODUCT_FIELDS
+
+class InsufficientStock(Exception):
+    """A stock change would have left a product with negative stock"""
+
+    def __init__(self, product_ids: list):
+        super().__init__(f"Insufficient stock for products {', '.join(map(str, product_ids))}")
+        self.product_ids = product_ids
+
+def lock_products(product_ids) -> dict:
+    """Lock products in id order for the rest of the transaction; returns {id: stock_quantity}"""
+    if not product_ids:
+        return {}
+    rows = db.session.execute(
+        select(Product.id, Product.stock_quantity)
+        .where(Product.id.in_(product_ids))
+        .order_by(Product.id)
+        .with_for_update()
+    )
+    return dict(rows.all())
+
+def apply_stock_changes(changes: dict) -> dict:
+    """Apply {product_id: quantity_change} with one conditional UPDATE ... RETURNING.
+
+    Returns {product_id: product dict} with the updated rows; products that
+    don't exist are left out. Raises InsufficientStock if any change would
+    make a product's stock negative. The other rows of the statement are
+    still updated then, so the caller has to roll back.
+    """
+    if not changes:
+        return {}
+
+    delta = case(changes, value=Product.id)
+    rows = db.session.execute(
+        update(Product)
+        .where(Product.id.in_(sorted(changes)), Product.stock_quantity + delta >= 0)
+        .values(stock_quantity=Product.stock_quantity + delta)
+        .returning(*PRODUCT_FIELDS)
+        .execution_options(synchronize_session=False)
+    )
+    updated = {row.id: row._asdict() for row in rows}
+
+    rejected = [product_id for product_id in sorted(changes) if product_id not in updated]
+    if rejected:
+        existing = set(db.session.scalars(select(Product.id).where(Product.id.in_(rejected))))
+        if existing:
+            raise InsufficientStock(sorted(existing))
+    return updated
+
+def applied_orders(order_ids) -> dict:
+    """{reference_id: movement_type} of the given orders whose stock changes were already applied.
+
+    Order events are delivered at least once (consumer redelivery, outbox
+    relay retries); an order with movements has been applied and must not
+    change stock again. ux_stock_movements_order_reference enforces it.
+    """
+    reference_ids = {str(order_id) for order_id in order_ids if order_id is not None}
+    if not reference_ids:
+        return {}
+    rows = db.session.execute(
+        select(StockMovement.reference_id, StockMovement.movement_type)
+        .where(StockMovement.reference_id.in_(reference_ids), StockMovement.movement_type.in_(ORDER_MOVEMENT_TYPES))
+        .distinct()
+    )
+    return dict(rows.all())
+
+def add_stock_movements(movements: list):
+    """Insert stock movement rows (dicts of StockMovement columns) with one statement"""
+    if movements:
+        db.session.execute(insert(StockMovement), movements)
+
+def stock_update_message(product: dict, old_quantity: int, new_quantity: int, movement: dict) -> dict:
+    """STOCK_UPDATE event for one movement, with the product's low-stock threshold and state"""
+    return {
+        'product_id': product['id'],
+        'old_quantity': old_quantity,
+        'new_quantity': new_quantity,
+        'quantity_change': movement['quantity_change'],
+        'movement_type': movement['movement_type'],
+        'reference_id': movement.get('reference_id'),
+        'min_stock_level': product['min_stock_level'],
+        'low_stock': is_low_stock(new_quantity, product['min_stock_level'])
+    }
+
+def stock_update_messages(stock: dict, movements: list, products: dict) -> list:
+    """One STOCK_UPDATE event per product for a set of applied movements.
+
+    stock holds the quantities before the movements ({product_id: quantity})
+    and products the updated rows. Consumers only need each product's final
+    quantity, so a batch touching a product several times sends one event
+    with the net change; movement_type and reference_id are kept when they
+    are the same for every movement, otherwise they are 'multiple' / None.
+    """
+    by_product = {}
+    for movement in movements:
+        by_product.setdefault(movement['product_id'], []).append(movement)
+
+    messages = []
+    for product_id, product_movements in by_product.items():
+        movement_types = {movement['movement_type'] for movement in product_movements}
+        references = {movement.get('reference_id') for movement in product_movements}
+        net_movement = {
+            'quantity_change': sum(movement['quantity_change'] for movement in product_movements),
+            'movement_type': movement_types.pop() if len(movement_types) == 1 else 'multiple',
+            'reference_id': references.pop() if len(references) == 1 else None
+        }
+        product = products[product_id]
+        messages.append(stock_update_message(product, stock[product_id], product['stock_quantity'], net_movement))
+    return messages
@@ -0,0 +1,45 @@
+"""Background processes of the inventory service.
+
+The Kafka consumer runs outside the gunicorn web workers, so it can be
+scaled on its own and never competes with HTTP requests for the GIL:
+
+    python -m services.inventory.worker migrate
+    python -m services.inventory.worker consumer
+"""
+import argparse
+import signal
+import sys
+
+# Add parent directories to path to import shared modules
+sys.path.append('/app')
+sys.path.append('/app/shared')
+
+from shared.kafka_client import kafka_client
+from shared.utils import setup_logging
+from services.inventory.app import create_app, create_tables
+from services.inventory.kafka_consumer import start_kafka_consumer_with_app
+
+logger = setup_logging('inventory-worker')
+
+ROLES = {
+    'consumer': start_kafka_consumer_with_app
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('role', choices=['migrate'] + list(ROLES))
+    args = parser.parse_args()
+
+    app = create_app()
+    create_tables(app)
+    if args.role == 'migrate':
+        return
+
+    # Let the consumer finish its current batch and commit on shutdown
+    signal.signal(signal.SIGTERM, lambda signum, frame: kafka_client.stop())
+
+    logger.info(f"Starting inventory {args.role}")
+    ROLES[args.role](app)()
+
+if __name__ == '__main__':
+    main()
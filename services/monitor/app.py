@@ -1,38 +1,33 @@
-from flask import Flask, jsonify, render_template, send_from_directory
+from flask import Blueprint, Flask, jsonify, render_template, send_from_directory
 from datetime import datetime, timedelta
-import requests
-import threading
-import time
 import os
 import sys
-from collections import defaultdict, deque
 
 # Add parent directories to path
 sys.path.append('/app')
 sys.path.append('/app/shared')
 
 from shared.kafka_client import kafka_client, Topics
+from shared.json_provider import init_json_provider
 from shared.utils import setup_logging, health_check_response
 from services.monitor.health_checker import HealthChecker
-from services.monitor.kafka_monitor import start_kafka_monitor
+from services.monitor.store import monitor_store
 
-app = Flask(__name__, template_folder='templates')
+bp = Blueprint('monitor', __name__)
 
 # Setup logging
 logger = setup_logging('monitor-service')
 
-# Global variables for monitoring data
+# Live health checks; history, alerts and Kafka stats are recorded by the
+# monitor worker in monitor_store
 health_checker = HealthChecker()
-service_health_history = defaultdict(lambda: deque(maxlen=100))  # Keep last 100 health checks
-kafka_message_stats = defaultdict(int)
-system_alerts = deque(maxlen=50)  # Keep last 50 alerts
 
-@app.route('/health', methods=['GET'])
+@bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint for monitor service itself"""
     return jsonify(health_check_response('monitor-service')), 200
 
-@app.route('/services/health', methods=['GET'])
+@bp.route('/services/health', methods=['GET'])
 def get_services_health():
     """Get current health status of all monitored services"""
     try:
@@ -54,7 +49,7 @@ def get_services_health():
         logger.error(f"Error getting services health: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/services/<service_name>/health', methods=['GET'])
+@bp.route('/services/<service_name>/health', methods=['GET'])
 def get_service_health(service_name):
     """Get health status of specific service"""
     try:
@@ -69,15 +64,14 @@ def get_service_health(service_name):
         logger.error(f"Error getting health for service {service_name}: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/services/<service_name>/history', methods=['GET'])
+@bp.route('/services/<service_name>/history', methods=['GET'])
 def get_service_health_history(service_name):
     """Get health history for specific service"""
     try:
-        if service_name not in service_health_history:
+        history = monitor_store.get_health_history().get(service_name)
+        if not history:
             return jsonify({'error': f'No history found for service {service_name}'}), 404
         
-        history = list(service_health_history[service_name])
-        
         # Calculate uptime percentage
         total_checks = len(history)
         healthy_checks = sum(1 for check in history if check.get('status') == 'healthy')
@@ -97,14 +91,16 @@ def get_service_health_history(service_name):
         logger.error(f"Error getting history for service {service_name}: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/kafka/stats', methods=['GET'])
+@bp.route('/kafka/stats', methods=['GET'])
 def get_kafka_stats():
     """Get Kafka message statistics"""
     try:
+        message_stats = monitor_store.get_message_stats()
         response = {
             'timestamp': datetime.utcnow().isoformat(),
-            'message_stats': dict(kafka_message_stats),
-            'total_messages': sum(kafka_message_stats.values())
+            'message_stats': message_stats,
+            'total_messages': sum(message_stats.values()),
+            'consumers': get_consumer_groups_summary()
         }
         
         return jsonify(response), 200
@@ -113,14 +109,15 @@ def get_kafka_stats():
         logger.error(f"Error getting Kafka stats: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/alerts', methods=['GET'])
+@bp.route('/alerts', methods=['GET'])
 def get_alerts():
     """Get system alerts"""
     try:
+        alerts = monitor_store.get_alerts()
         response = {
             'timestamp': datetime.utcnow().isoformat(),
-            'alerts': list(system_alerts),
-            'total_alerts': len(system_alerts)
+            'alerts': alerts,
+            'total_alerts': len(alerts)
         }
         
         return jsonify(response), 200
@@ -129,7 +126,24 @@ def get_alerts():
         logger.error(f"Error getting alerts: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/dashboard', methods=['GET'])
+@bp.route('/low-stock', methods=['GET'])
+def get_low_stock():
+    """Get products at or below their minimum stock level, lowest stock first"""
+    try:
+        products = monitor_store.get_low_stock()
+        response = {
+            'timestamp': datetime.utcnow().isoformat(),
+            'products': products,
+            'total_products': len(products)
+        }
+        
+        return jsonify(response), 200
+        
+    except Exception as e:
+        logger.error(f"Error getting low stock products: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/dashboard', methods=['GET'])
 def dashboard():
     """Serve the dashboard HTML page"""
     try:
@@ -138,7 +152,7 @@ def dashboard():
         logger.error(f"Error serving dashboard: {e}")
         return f"Error loading dashboard: {str(e)}", 500
 
-@app.route('/api/monitor/dashboard', methods=['GET'])
+@bp.route('/api/monitor/dashboard', methods=['GET'])
 def get_dashboard_data():
     """Get comprehensive dashboard data"""
     try:
@@ -150,7 +164,9 @@ def get_dashboard_data():
         system_health_percentage = (healthy_services / total_services * 100) if total_services > 0 else 0
         
         # Get recent alerts (last 10)
-        recent_alerts = list(system_alerts)[-10:]
+        alerts = monitor_store.get_alerts()
+        recent_alerts = alerts[-10:]
+        message_stats = monitor_store.get_message_stats()
         
         response = {
             'timestamp': datetime.utcnow().isoformat(),
@@ -162,11 +178,12 @@ def get_dashboard_data():
             },
             'services': services_status,
             'kafka_stats': {
-                'message_stats': dict(kafka_message_stats),
-                'total_messages': sum(kafka_message_stats.values())
+                'message_stats': message_stats,
+                'total_messages': sum(message_stats.values())
             },
             'recent_alerts': recent_alerts,
-            'total_alerts': len(system_alerts)
+            'total_alerts': len(alerts),
+            'low_stock_products': len(monitor_store.get_low_stock())
         }
         
         return jsonify(response), 200
@@ -175,15 +192,15 @@ def get_dashboard_data():
         logger.error(f"Error getting dashboard data: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/api/monitor/health-history', methods=['GET'])
+@bp.route('/api/monitor/health-history', methods=['GET'])
 def get_health_history():
     """Get historical health data for charts"""
     try:
         # Get last 30 data points for each service
         history_data = {}
         
-        for service_name, history in service_health_history.items():
-            service_history = list(history)[-30:]  # Last 30 points
+        for service_name, history in monitor_store.get_health_history().items():
+            service_history = history[-30:]  # Last 30 points
             history_data[service_name] = [
                 {
                     'timestamp': entry['timestamp'],
@@ -202,81 +219,40 @@ def get_health_history():
         logger.error(f"Error getting health history: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-def add_alert(alert_type: str, message: str, service: str = None, severity: str = 'warning'):
-    """Add system alert"""
-    alert = {
-        'timestamp': datetime.utcnow().isoformat(),
-        'type': alert_type,
-        'message': message,
-        'service': service,
-        'severity': severity
-    }
-    
-    system_alerts.append(alert)
-    logger.warning(f"Alert added: {alert}")
-
-def update_service_health_history(service_name: str, health_data: dict):
-    """Update health history for a service"""
-    health_record = {
-        'timestamp': datetime.utcnow().isoformat(),
-        'status': health_data.get('status', 'unknown'),
-        'response_time': health_data.get('response_time'),
-        'details': health_data.get('details', {})
-    }
-    
-    service_health_history[service_name].append(health_record)
-
-def update_kafka_message_stats(topic: str):
-    """Update Kafka message statistics"""
-    kafka_message_stats[topic] += 1
+def get_consumer_groups_summary():
+    """Group the latest consumer snapshots by consumer group"""
+    groups = {}
+    for snapshot in monitor_store.get_consumer_metrics():
+        group = groups.setdefault(snapshot.get('group_id'), {
+            'lag': 0,
+            'messages': 0,
+            'errors': 0,
+            'messages_per_second': 0.0,
+            'consumers': []
+        })
+        totals = snapshot.get('totals', {})
+        group['lag'] += totals.get('lag', 0)
+        group['messages'] += totals.get('messages', 0)
+        group['errors'] += totals.get('errors', 0)
+        group['messages_per_second'] = round(group['messages_per_second'] + totals.get('messages_per_second', 0), 2)
+        group['consumers'].append(snapshot)
+    return groups
 
-def start_health_monitoring():
-    """Start periodic health monitoring"""
-    def monitor_loop():
-        while True:
-            try:
-                logger.info("Running health checks...")
-                
-                # Check all services
-                services_status = health_checker.get_all_services_status()
-                
-                for service_name, status in services_status.items():
-                    # Update history
-                    update_service_health_history(service_name, status)
-                    
-                    # Generate alerts for unhealthy services
-                    if status['status'] != 'healthy':
-                        add_alert(
-                            'service_unhealthy',
-                            f"Service {service_name} is {status['status']}",
-                            service_name,
-                            'critical' if status['status'] == 'down' else 'warning'
-                        )
-                
-                # Sleep for 30 seconds before next check
-                time.sleep(30)
-                
-            except Exception as e:
-                logger.error(f"Error in health monitoring loop: {e}")
-                time.sleep(30)
-    
-    # Start monitoring in background thread
-    monitor_thread = threading.Thread(target=monitor_loop, daemon=True)
-    monitor_thread.start()
-    logger.info("Started health monitoring thread")
+def create_app():
+    """Create the monitor service WSGI app"""
+    app = Flask(__name__, template_folder='templates')
+    init_json_provider(app)
+    app.register_blueprint(bp)
+    return app
 
 if __name__ == '__main__':
-    # Start health monitoring
-    start_health_monitoring()
+    # Development mode: web server, health checks and Kafka monitor in one
+    # process. In production the app runs under gunicorn and the background
+    # work in services.monitor.worker, sharing data through Redis.
+    from services.monitor.worker import start_worker_threads
     
-    # Start Kafka monitoring
-    kafka_monitor_thread = threading.Thread(
-        target=start_kafka_monitor, 
-        args=(update_kafka_message_stats, add_alert),
-        daemon=True
-    )
-    kafka_monitor_thread.start()
-    logger.info("Started Kafka monitoring thread")
+    app = create_app()
+    start_worker_threads(['health', 'kafka'])
     
     # Run Flask app
     app.run(host='0.0.0.0', port=5003, debug=False)
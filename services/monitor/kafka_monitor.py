@@ -1,3 +1,4 @@
+import os
 import sys
 from datetime import datetime
 from typing import Callable
@@ -7,20 +8,51 @@ sys.path.append('/app')
 sys.path.append('/app/shared')
 
 from shared.kafka_client import kafka_client, Topics
-from shared.utils import setup_logging
+from shared.models import is_low_stock
+from shared.utils import setup_logging, PAYLOAD
 
 logger = setup_logging('kafka-monitor')
 
-def handle_monitoring_message(topic: str, message: dict, stats_callback: Callable, alert_callback: Callable):
+# Total consumer lag above which a consumer group is reported as falling behind
+LAG_ALERT_THRESHOLD = int(os.getenv('KAFKA_LAG_ALERT_THRESHOLD', '1000'))
+
+def alert_low_stock(alert_callback: Callable, product_id: int, stock_quantity: int, min_stock_level):
+    """Raise the alert for a product that entered low stock"""
+    alert_callback(
+        'low_stock',
+        f"Low stock alert for product {product_id}: {stock_quantity} units remaining (minimum {min_stock_level})",
+        'inventory-service',
+        'warning'
+    )
+
+def handle_monitoring_message(topic: str, message: dict, stats_callback: Callable, alert_callback: Callable,
+                              metrics_callback: Callable = None, low_stock_callback: Callable = None):
     """Handle messages for monitoring purposes"""
     try:
         # Update message statistics
         stats_callback(topic)
         
-        logger.info(f"Monitored message from topic {topic}: {message}")
+        logger.info("Monitored message from topic %s: %s", topic, message, extra=PAYLOAD)
         
         # Analyze message for potential issues
-        if topic == Topics.ORDER_CREATED:
+        if topic == Topics.CONSUMER_METRICS:
+            # Consumer health snapshot published by a service's Kafka consumer
+            if metrics_callback:
+                metrics_callback(message)
+            
+            group_id = message.get('group_id')
+            total_lag = message.get('totals', {}).get('lag', 0)
+            
+            # Alert when a consumer group is falling behind
+            if total_lag > LAG_ALERT_THRESHOLD:
+                alert_callback(
+                    'consumer_lag',
+                    f"Consumer group {group_id} is lagging by {total_lag} messages",
+                    group_id,
+                    'warning'
+                )
+        
+        elif topic == Topics.ORDER_CREATED:
             # Monitor order creation
             order_type = message.get('order_type')
             total_amount = message.get('total_amount', 0)
@@ -59,16 +91,20 @@ def handle_monitoring_message(topic: str, message: dict, stats_callback: Callabl
             # Monitor stock updates
             product_id = message.get('product_id')
             new_quantity = message.get('new_quantity', 0)
-            movement_type = message.get('movement_type')
+            min_stock_level = message.get('min_stock_level')
+            
+            # Same threshold as the inventory's low-stock endpoint
+            low_stock = message.get('low_stock', is_low_stock(new_quantity, min_stock_level))
+            
+            # With a low-stock set, alert only when a product enters it rather than on every update
+            if low_stock_callback:
+                entered_low_stock = low_stock_callback(product_id, new_quantity, min_stock_level, low_stock)
+            else:
+                entered_low_stock = low_stock
             
             # Alert for low stock
-            if new_quantity <= 5:
-                alert_callback(
-                    'low_stock',
-                    f"Low stock alert for product {product_id}: {new_quantity} units remaining",
-                    'inventory-service',
-                    'warning'
-                )
+            if entered_low_stock:
+                alert_low_stock(alert_callback, product_id, new_quantity, min_stock_level)
             
             # Alert for negative stock (shouldn't happen but good to monitor)
             if new_quantity < 0:
@@ -133,7 +169,8 @@ def send_health_check_message():
     except Exception as e:
         logger.error(f"Error sending health check message: {e}")
 
-def start_kafka_monitor(stats_callback: Callable, alert_callback: Callable):
+def start_kafka_monitor(stats_callback: Callable, alert_callback: Callable, metrics_callback: Callable = None,
+                        low_stock_callback: Callable = None):
     """Start Kafka monitoring"""
     try:
         logger.info("Starting Kafka monitor")
@@ -147,13 +184,14 @@ def start_kafka_monitor(stats_callback: Callable, alert_callback: Callable):
             Topics.ORDER_PROCESSED,
             Topics.STOCK_UPDATE,
             Topics.HEALTH_CHECK,
-            Topics.SYSTEM_ERROR
+            Topics.SYSTEM_ERROR,
+            Topics.CONSUMER_METRICS
         ]
         
         group_id = 'monitor-service-group'
         
         def message_handler(topic: str, message: dict):
-            handle_monitoring_message(topic, message, stats_callback, alert_callback)
+            handle_monitoring_message(topic, message, stats_callback, alert_callback, metrics_callback, low_stock_callback)
         
         kafka_client.consume_messages(topics, group_id, message_handler)
         
@@ -0,0 +1,224 @@
+import json
+import logging
+import os
+import threading
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+HEALTH_HISTORY_SIZE = 100  # Keep last 100 health checks per service
+ALERTS_SIZE = 50  # Keep last 50 alerts
+
+# Consumer snapshots older than this (a few publish intervals) belong to
+# consumers that stopped or were scaled down and are dropped
+CONSUMER_METRICS_MAX_AGE = float(os.getenv(
+    'CONSUMER_METRICS_MAX_AGE', str(3 * float(os.getenv('KAFKA_METRICS_INTERVAL', '15')))
+))
+
+def is_stale_snapshot(snapshot: dict) -> bool:
+    """True when a consumer snapshot wasn't refreshed within CONSUMER_METRICS_MAX_AGE"""
+    received_at = snapshot.get('received_at')
+    if not received_at:
+        return True
+    return datetime.fromisoformat(received_at) < datetime.utcnow() - timedelta(seconds=CONSUMER_METRICS_MAX_AGE)
+
+class MonitorStore:
+    """Monitoring data kept in process memory.
+
+    Only the process that records the data can read it back, so the web app
+    and the monitor worker have to share a process (development mode).
+    """
+
+    def __init__(self):
+        self.service_health_history = defaultdict(lambda: deque(maxlen=HEALTH_HISTORY_SIZE))
+        self.kafka_message_stats = defaultdict(int)
+        self.system_alerts = deque(maxlen=ALERTS_SIZE)
+        self.consumer_metrics = {}  # "group_id/client_id" -> latest consumer metrics snapshot
+        self.low_stock = {}  # product_id -> (stock_quantity, min_stock_level)
+        self._lock = threading.Lock()
+
+    def add_alert(self, alert: dict):
+        self.system_alerts.append(alert)
+
+    def get_alerts(self) -> list:
+        """Alerts, oldest first"""
+        return list(self.system_alerts)
+
+    def add_health_record(self, service_name: str, record: dict):
+        self.service_health_history[service_name].append(record)
+
+    def get_health_history(self) -> dict:
+        """Health records of every service, oldest first"""
+        return {name: list(history) for name, history in list(self.service_health_history.items())}
+
+    def increment_message_count(self, topic: str):
+        with self._lock:
+            self.kafka_message_stats[topic] += 1
+
+    def get_message_stats(self) -> dict:
+        return dict(self.kafka_message_stats)
+
+    def set_consumer_metrics(self, key: str, snapshot: dict):
+        self.consumer_metrics[key] = snapshot
+
+    def get_consumer_metrics(self) -> list:
+        """Snapshots of live consumers; stale ones are removed"""
+        with self._lock:
+            for key, snapshot in list(self.consumer_metrics.items()):
+                if is_stale_snapshot(snapshot):
+                    del self.consumer_metrics[key]
+            return list(self.consumer_metrics.values())
+
+    def update_low_stock(self, product_id: int, stock_quantity: int, min_stock_level, low_stock: bool) -> bool:
+        """Add or remove a product from the low-stock set; True when it just entered it"""
+        with self._lock:
+            if not low_stock:
+                self.low_stock.pop(product_id, None)
+                return False
+            entered = product_id not in self.low_stock
+            self.low_stock[product_id] = (stock_quantity, min_stock_level)
+            return entered
+
+    def replace_low_stock(self, products: list) -> list:
+        """Replace the low-stock set with a full snapshot; returns the ids that weren't in it"""
+        with self._lock:
+            entered = [product['product_id'] for product in products if product['product_id'] not in self.low_stock]
+            self.low_stock = {
+                product['product_id']: (product['stock_quantity'], product['min_stock_level'])
+                for product in products
+            }
+            return entered
+
+    def get_low_stock(self) -> list:
+        """Low-stock products, lowest stock first"""
+        return [
+            {'product_id': product_id, 'stock_quantity': stock_quantity, 'min_stock_level': min_stock_level}
+            for product_id, (stock_quantity, min_stock_level)
+            in sorted(self.low_stock.items(), key=lambda item: (item[1][0], item[0]))
+        ]
+
+class RedisMonitorStore:
+    """Monitoring data in Redis, shared by the gunicorn workers and the monitor worker"""
+
+    def __init__(self, url: str, prefix: str = 'monitor:'):
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def _key(self, *parts) -> str:
+        return self.prefix + ':'.join(parts)
+
+    def add_alert(self, alert: dict):
+        pipe = self.redis.pipeline()
+        pipe.lpush(self._key('alerts'), json.dumps(alert))
+        pipe.ltrim(self._key('alerts'), 0, ALERTS_SIZE - 1)
+        pipe.execute()
+
+    def get_alerts(self) -> list:
+        """Alerts, oldest first"""
+        return [json.loads(alert) for alert in reversed(self.redis.lrange(self._key('alerts'), 0, -1))]
+
+    def add_health_record(self, service_name: str, record: dict):
+        key = self._key('health', service_name)
+        pipe = self.redis.pipeline()
+        pipe.sadd(self._key('health-services'), service_name)
+        pipe.lpush(key, json.dumps(record))
+        pipe.ltrim(key, 0, HEALTH_HISTORY_SIZE - 1)
+        pipe.execute()
+
+    def get_health_history(self) -> dict:
+        """Health records of every service, oldest first"""
+        services = sorted(self.redis.smembers(self._key('health-services')))
+        pipe = self.redis.pipeline()
+        for service_name in services:
+            pipe.lrange(self._key('health', service_name), 0, -1)
+        return {
+            service_name: [json.loads(record) for record in reversed(records)]
+            for service_name, records in zip(services, pipe.execute())
+        }
+
+    def increment_message_count(self, topic: str):
+        self.redis.hincrby(self._key('message-stats'), topic, 1)
+
+    def get_message_stats(self) -> dict:
+        return {topic: int(count) for topic, count in self.redis.hgetall(self._key('message-stats')).items()}
+
+    def set_consumer_metrics(self, key: str, snapshot: dict):
+        self.redis.hset(self._key('consumer-metrics'), key, json.dumps(snapshot))
+
+    def get_consumer_metrics(self) -> list:
+        """Snapshots of live consumers; stale ones are removed"""
+        snapshots = {
+            key: json.loads(snapshot) for key, snapshot in self.redis.hgetall(self._key('consumer-metrics')).items()
+        }
+        stale = [key for key, snapshot in snapshots.items() if is_stale_snapshot(snapshot)]
+        if stale:
+            self.redis.hdel(self._key('consumer-metrics'), *stale)
+        return [snapshot for key, snapshot in snapshots.items() if key not in stale]
+
+    def update_low_stock(self, product_id: int, stock_quantity: int, min_stock_level, low_stock: bool) -> bool:
+        """Add or remove a product from the low-stock sorted set (scored by stock); True when it just entered it"""
+        pipe = self.redis.pipeline()
+        if not low_stock:
+            pipe.zrem(self._key('low-stock'), product_id)
+            pipe.hdel(self._key('low-stock-levels'), product_id)
+            pipe.execute()
+            return False
+        pipe.zadd(self._key('low-stock'), {product_id: stock_quantity})
+        pipe.hset(self._key('low-stock-levels'), product_id, json.dumps(min_stock_level))
+        return pipe.execute()[0] == 1
+
+    def replace_low_stock(self, products: list) -> list:
+        """Replace the low-stock set with a full snapshot; returns the ids that weren't in it.
+
+        The snapshot is written to temporary keys and renamed over the live
+        ones in one transaction, so readers never see a partial set.
+        """
+        previous = {int(product_id) for product_id in self.redis.zrange(self._key('low-stock'), 0, -1)}
+        pipe = self.redis.pipeline()
+        pipe.delete(self._key('low-stock-sync'), self._key('low-stock-levels-sync'))
+        if products:
+            pipe.zadd(self._key('low-stock-sync'), {
+                product['product_id']: product['stock_quantity'] for product in products
+            })
+            pipe.hset(self._key('low-stock-levels-sync'), mapping={
+                product['product_id']: json.dumps(product['min_stock_level']) for product in products
+            })
+            pipe.rename(self._key('low-stock-sync'), self._key('low-stock'))
+            pipe.rename(self._key('low-stock-levels-sync'), self._key('low-stock-levels'))
+        else:
+            pipe.delete(self._key('low-stock'), self._key('low-stock-levels'))
+        pipe.execute()
+        return [product['product_id'] for product in products if product['product_id'] not in previous]
+
+    def get_low_stock(self) -> list:
+        """Low-stock products, lowest stock first"""
+        products = self.redis.zrange(self._key('low-stock'), 0, -1, withscores=True)
+        if not products:
+            return []
+        levels = self.redis.hmget(self._key('low-stock-levels'), [product_id for product_id, _ in products])
+        return [
+            {
+                'product_id': int(product_id),
+                'stock_quantity': int(stock_quantity),
+                'min_stock_level': json.loads(level) if level is not None else None
+            }
+            for (product_id, stock_quantity), level in zip(products, levels)
+        ]
+
+def create_monitor_store():
+    """Redis-backed store when REDIS_URL is set, otherwise in-process memory"""
+    redis_url = os.getenv('REDIS_URL')
+    if redis_url:
+        if redis is None:
+            logger.warning("REDIS_URL is set but the redis package is not installed, keeping monitor data in memory")
+        else:
+            return RedisMonitorStore(redis_url)
+    return MonitorStore()
+
+monitor_store = create_monitor_store()
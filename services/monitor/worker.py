@@ -0,0 +1,176 @@
+"""Background processes of the monitor service.
+
+Health checks (with the periodic low-stock resync) and the Kafka monitor
+run outside the gunicorn web workers and record their data in the monitor
+store (Redis when REDIS_URL is set):
+
+    python -m services.monitor.worker health
+    python -m services.monitor.worker kafka
+
+Run a single health process; the Kafka monitor can be scaled like any
+other consumer group.
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+# Add parent directories to path
+sys.path.append('/app')
+sys.path.append('/app/shared')
+
+from shared.kafka_client import kafka_client
+from shared.utils import setup_logging
+from services.monitor.health_checker import HealthChecker
+from services.monitor.kafka_monitor import alert_low_stock, start_kafka_monitor
+from services.monitor.store import monitor_store
+
+logger = setup_logging('monitor-worker')
+
+HEALTH_CHECK_INTERVAL = 30  # seconds
+
+# Source of the full low-stock snapshot and how often the set is rebuilt from it
+INVENTORY_LOW_STOCK_URL = os.getenv('INVENTORY_LOW_STOCK_URL', 'http://inventory-service:5001/products/low-stock')
+LOW_STOCK_SYNC_INTERVAL = float(os.getenv('LOW_STOCK_SYNC_INTERVAL', '300'))  # seconds
+
+health_checker = HealthChecker()
+
+def add_alert(alert_type: str, message: str, service: str = None, severity: str = 'warning'):
+    """Add system alert"""
+    alert = {
+        'timestamp': datetime.utcnow().isoformat(),
+        'type': alert_type,
+        'message': message,
+        'service': service,
+        'severity': severity
+    }
+
+    monitor_store.add_alert(alert)
+    logger.warning(f"Alert added: {alert}")
+
+def update_service_health_history(service_name: str, health_data: dict):
+    """Update health history for a service"""
+    health_record = {
+        'timestamp': datetime.utcnow().isoformat(),
+        'status': health_data.get('status', 'unknown'),
+        'response_time': health_data.get('response_time'),
+        'details': health_data.get('details', {})
+    }
+
+    monitor_store.add_health_record(service_name, health_record)
+
+def update_kafka_message_stats(topic: str):
+    """Update Kafka message statistics"""
+    monitor_store.increment_message_count(topic)
+
+def update_consumer_metrics(snapshot: dict):
+    """Store the latest metrics snapshot published by a consumer"""
+    snapshot = dict(snapshot, received_at=datetime.utcnow().isoformat())
+    monitor_store.set_consumer_metrics(f"{snapshot.get('group_id')}/{snapshot.get('client_id')}", snapshot)
+
+def update_low_stock(product_id: int, stock_quantity: int, min_stock_level, low_stock: bool) -> bool:
+    """Keep the low-stock set in sync with stock updates; True when the product just became low"""
+    return monitor_store.update_low_stock(product_id, stock_quantity, min_stock_level, low_stock)
+
+def sync_low_stock():
+    """Rebuild the low-stock set from the inventory's low-stock endpoint.
+
+    STOCK_UPDATE events keep the set current between syncs; the sync covers
+    products that were already low when the monitor started and changes
+    made while it was down. Products that entered the set get an alert.
+    """
+    try:
+        response = requests.get(INVENTORY_LOW_STOCK_URL, timeout=10)
+        response.raise_for_status()
+        products = [
+            {
+                'product_id': product['id'],
+                'stock_quantity': product['stock_quantity'],
+                'min_stock_level': product['min_stock_level']
+            }
+            for product in response.json()
+        ]
+    except Exception as e:
+        logger.error(f"Error fetching low stock products from inventory: {e}")
+        return False
+
+    products_by_id = {product['product_id']: product for product in products}
+    for product_id in monitor_store.replace_low_stock(products):
+        product = products_by_id[product_id]
+        alert_low_stock(add_alert, product_id, product['stock_quantity'], product['min_stock_level'])
+
+    logger.info(f"Synced low stock set: {len(products)} products")
+    return True
+
+def run_health_checks():
+    """Check every service periodically, recording history and alerts"""
+    last_low_stock_sync = None
+    while True:
+        try:
+            # Seed the low-stock set at startup, then resync it periodically
+            if last_low_stock_sync is None or time.time() - last_low_stock_sync >= LOW_STOCK_SYNC_INTERVAL:
+                if sync_low_stock():
+                    last_low_stock_sync = time.time()
+
+            logger.info("Running health checks...")
+
+            # Check all services
+            services_status = health_checker.get_all_services_status()
+
+            for service_name, status in services_status.items():
+                # Update history
+                update_service_health_history(service_name, status)
+
+                # Generate alerts for unhealthy services
+                if status['status'] != 'healthy':
+                    add_alert(
+                        'service_unhealthy',
+                        f"Service {service_name} is {status['status']}",
+                        service_name,
+                        'critical' if status['status'] == 'down' else 'warning'
+                    )
+
+            time.sleep(HEALTH_CHECK_INTERVAL)
+
+        except Exception as e:
+            logger.error(f"Error in health monitoring loop: {e}")
+            time.sleep(HEALTH_CHECK_INTERVAL)
+
+def run_kafka_monitor():
+    """Consume every topic and record message stats, alerts and consumer metrics"""
+    start_kafka_monitor(update_kafka_message_stats, add_alert, update_consumer_metrics, update_low_stock)
+
+ROLES = {
+    'health': run_health_checks,
+    'kafka': run_kafka_monitor
+}
+
+def start_worker_threads(roles: list):
+    """Run the given roles in daemon threads of the current process"""
+    for role in roles:
+        thread = threading.Thread(target=ROLES[role], name=f'monitor-{role}', daemon=True)
+        thread.start()
+        logger.info(f"Started {role} thread")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('role', choices=list(ROLES))
+    args = parser.parse_args()
+
+    def shutdown(signum, frame):
+        kafka_client.stop()
+        if args.role == 'health':
+            sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+
+    logger.info(f"Starting monitor {args.role}")
+    ROLES[args.role]()
+
+if __name__ == '__main__':
+    main()
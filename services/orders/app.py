@@ -1,35 +1,46 @@
-from flask import Flask, request, jsonify
-from flask_migrate import upgrade
+from flask import Blueprint, Flask, request, jsonify
 from datetime import datetime
-from sqlalchemy import text
+from sqlalchemy import insert, select, text, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 import os
 import sys
-import threading
 
 # Add parent directories to path to import shared modules
 sys.path.append('/app')
 sys.path.append('/app/shared')
 
-from shared.database import db, init_db, get_db_uri
+from shared.database import db, init_db, get_binds, get_db_uri, get_engine_options, read_only, run_migrations
 from shared.models import Order, OrderItem, OrderStatus, OrderType
 from shared.kafka_client import kafka_client, Topics
-from shared.utils import setup_logging, validate_json, health_check_response, generate_order_number
-from services.orders.kafka_consumer import start_kafka_consumer_with_app
+from shared.export import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, stream_export
+from shared.idempotency import (
+    IdempotencyConflict, get_idempotency_key, get_stored_response, purge_expired_keys,
+    replay_response, request_fingerprint, stage_response
+)
+from shared.outbox import add_outbox_event, add_outbox_events, start_outbox_relay_with_app
+from shared import order_stats
+from shared.http_cache import conditional_response, resource_etag
+from shared.json_provider import init_json_provider
+from shared.serializers import ORDER_FIELDS, order_items_by_order, row_dicts
+from shared.pagination import COUNT_MODES, InvalidCursor, clamp_limit, count_rows, decode_cursor, encode_cursor
+from shared.utils import setup_logging, validate_json, health_check_response, generate_order_number, parse_datetime_param
 
-app = Flask(__name__)
-
-# Configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = get_db_uri('orders')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Initialize database
-init_db(app)
+bp = Blueprint('orders', __name__)
 
 # Setup logging
 logger = setup_logging('orders-service')
 
+ORDER_EXPORT_COLUMNS = [
+    'id', 'order_number', 'order_type', 'status', 'customer_name', 'customer_email',
+    'total_amount', 'created_at', 'updated_at', 'processed_at'
+]
+
+# Maximum number of orders accepted by POST /orders/bulk
+BULK_MAX_ORDERS = int(os.getenv('BULK_MAX_ORDERS', '1000'))
+
 # API Routes
-@app.route('/health', methods=['GET'])
+@bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     try:
@@ -48,15 +59,27 @@ def health_check():
         {'database': db_status}
     )), 200 if status == "healthy" else 503
 
-@app.route('/orders', methods=['GET'])
+@bp.route('/orders', methods=['GET'])
+@read_only
 def get_orders():
-    """Get all orders with optional filtering"""
+    """Get all orders with optional filtering.
+
+    Pages either with limit/offset or, for deep pages, with the opaque
+    next_cursor returned by the previous page (keyset on created_at, id).
+    The total is the planner's estimate unless count=exact is requested;
+    count=none skips it.
+    """
     try:
         # Get query parameters
         status_filter = request.args.get('status')
         order_type_filter = request.args.get('type')
-        limit = request.args.get('limit', type=int, default=50)
+        limit = clamp_limit(request.args.get('limit', type=int, default=50))
         offset = request.args.get('offset', type=int, default=0)
+        cursor = request.args.get('cursor')
+        count_mode = request.args.get('count', 'estimated').lower()
+        
+        if count_mode not in COUNT_MODES:
+            return jsonify({'error': f'Invalid count mode: {count_mode}'}), 400
         
         query = Order.query
         
@@ -75,28 +98,102 @@ def get_orders():
             except ValueError:
                 return jsonify({'error': f'Invalid order type: {order_type_filter}'}), 400
         
-        # Apply pagination and ordering
-        orders = query.order_by(Order.created_at.desc()).offset(offset).limit(limit).all()
+        total, total_is_estimate = count_rows(query, count_mode)
         
-        # Include order items in response
-        orders_data = []
-        for order in orders:
-            order_data = order.to_dict()
-            order_data['items'] = [item.to_dict() for item in order.order_items]
-            orders_data.append(order_data)
+        # Apply pagination and ordering; only the serialized columns are selected
+        page_query = query.with_entities(*ORDER_FIELDS).order_by(Order.created_at.desc(), Order.id.desc())
+        if cursor:
+            try:
+                cursor_created_at, cursor_id = decode_cursor(cursor, datetime, int)
+            except InvalidCursor as e:
+                return jsonify({'error': str(e)}), 400
+            page_query = page_query.filter(tuple_(Order.created_at, Order.id) < tuple_(cursor_created_at, cursor_id))
+            offset = 0
+        
+        # Fetch one extra row to know whether there is a next page
+        orders = page_query.offset(offset).limit(limit + 1).all()
+        has_more = len(orders) > limit
+        orders_data = row_dicts(orders[:limit])
+        
+        # Include order items in response (loaded with a single extra query)
+        items = order_items_by_order([order['id'] for order in orders_data])
+        for order_data in orders_data:
+            order_data['items'] = items[order_data['id']]
         
         return jsonify({
             'orders': orders_data,
-            'total': query.count(),
+            'total': total,
+            'total_is_estimate': total_is_estimate,
             'limit': limit,
-            'offset': offset
+            'offset': offset,
+            'next_cursor': encode_cursor(orders_data[-1]['created_at'], orders_data[-1]['id']) if has_more else None
         }), 200
         
     except Exception as e:
         logger.error(f"Error getting orders: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/orders/<int:order_id>', methods=['GET'])
+@bp.route('/orders/export', methods=['GET'])
+@read_only
+def export_orders():
+    """Stream orders as NDJSON (with items) or CSV (one row per order).
+
+    Filters: since/until on created_at, status and type. Rows are read with
+    a server-side cursor in chunks, so memory use doesn't grow with the
+    size of the export.
+    """
+    try:
+        export_format = request.args.get('format', 'ndjson').lower()
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'error': f'Invalid format: {export_format}'}), 400
+        
+        try:
+            since = parse_datetime_param('since')
+            until = parse_datetime_param('until')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        query = select(Order).order_by(Order.created_at, Order.id)
+        
+        if since:
+            query = query.where(Order.created_at >= since)
+        if until:
+            query = query.where(Order.created_at < until)
+        
+        status_filter = request.args.get('status')
+        if status_filter:
+            try:
+                query = query.where(Order.status == OrderStatus(status_filter.lower()))
+            except ValueError:
+                return jsonify({'error': f'Invalid status: {status_filter}'}), 400
+        
+        order_type_filter = request.args.get('type')
+        if order_type_filter:
+            try:
+                query = query.where(Order.order_type == OrderType(order_type_filter.lower()))
+            except ValueError:
+                return jsonify({'error': f'Invalid order type: {order_type_filter}'}), 400
+        
+        with_items = export_format == 'ndjson'
+        if with_items:
+            # Items are loaded per chunk with one IN query
+            query = query.options(selectinload(Order.order_items))
+        
+        def rows():
+            result = db.session.execute(query.execution_options(yield_per=EXPORT_CHUNK_SIZE)).scalars()
+            for order in result:
+                order_data = order.to_dict()
+                if with_items:
+                    order_data['items'] = [item.to_dict() for item in order.order_items]
+                yield order_data
+        
+        return stream_export(rows(), export_format, ORDER_EXPORT_COLUMNS, 'orders')
+        
+    except Exception as e:
+        logger.error(f"Error exporting orders: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/orders/<int:order_id>', methods=['GET'])
 def get_order(order_id):
     """Get specific order"""
     try:
@@ -104,44 +201,104 @@ def get_order(order_id):
         if not order:
             return jsonify({'error': 'Order not found'}), 404
         
-        order_data = order.to_dict()
-        order_data['items'] = [item.to_dict() for item in order.order_items]
+        def build():
+            # Items are only loaded when the client's copy is stale
+            order_data = order.to_dict()
+            order_data['items'] = [item.to_dict() for item in order.order_items]
+            return order_data
         
-        return jsonify(order_data), 200
+        return conditional_response(resource_etag(order), build, private=True)
     except Exception as e:
         logger.error(f"Error getting order {order_id}: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/orders', methods=['POST'])
+class OrderValidationError(Exception):
+    """Order payload rejected with a message for the client"""
+
+def validate_order_data(data: dict):
+    """Validate an order payload and compute item and order totals.
+
+    Returns (order_type, items_data, total_amount); raises
+    OrderValidationError for invalid input.
+    """
+    # Validate order type
+    try:
+        order_type = OrderType(data['order_type'].lower())
+    except ValueError:
+        raise OrderValidationError(f'Invalid order type: {data["order_type"]}')
+    
+    # Validate items
+    items_data = data['items']
+    if not items_data or not isinstance(items_data, list):
+        raise OrderValidationError('Items must be a non-empty list')
+    
+    # Calculate total amount
+    total_amount = 0
+    for item in items_data:
+        if not all(key in item for key in ['product_id', 'product_name', 'quantity', 'unit_price']):
+            raise OrderValidationError('Each item must have product_id, product_name, quantity, and unit_price')
+        
+        if item['quantity'] <= 0 or item['unit_price'] <= 0:
+            raise OrderValidationError('Quantity and unit_price must be positive')
+        
+        item_total = item['quantity'] * item['unit_price']
+        total_amount += item_total
+        item['total_price'] = item_total
+    
+    return order_type, items_data, total_amount
+
+def build_order_created_message(order_data: dict, items_data: list):
+    """Build the ORDER_CREATED event from a serialized order and its items"""
+    return {
+        'order_id': order_data['id'],
+        'order_number': order_data['order_number'],
+        'order_type': order_data['order_type'],
+        'customer_name': order_data['customer_name'],
+        'customer_email': order_data['customer_email'],
+        'total_amount': order_data['total_amount'],
+        'order_items': [
+            {
+                'product_id': item['product_id'],
+                'product_name': item['product_name'],
+                'quantity': item['quantity'],
+                'unit_price': float(item['unit_price']),
+                'total_price': float(item['total_price'])
+            }
+            for item in items_data
+        ],
+        'created_at': order_data['created_at']
+    }
+
+@bp.route('/orders', methods=['POST'])
 @validate_json('order_type', 'customer_name', 'items')
 def create_order():
-    """Create new order"""
+    """Create new order.
+
+    With an Idempotency-Key header the response is stored in the same
+    transaction as the order, and retries with that key get it back
+    without creating another order.
+    """
     try:
         data = request.get_json()
         
-        # Validate order type
         try:
-            order_type = OrderType(data['order_type'].lower())
-        except ValueError:
-            return jsonify({'error': f'Invalid order type: {data["order_type"]}'}), 400
-        
-        # Validate items
-        items_data = data['items']
-        if not items_data or not isinstance(items_data, list):
-            return jsonify({'error': 'Items must be a non-empty list'}), 400
-        
-        # Calculate total amount
-        total_amount = 0
-        for item in items_data:
-            if not all(key in item for key in ['product_id', 'product_name', 'quantity', 'unit_price']):
-                return jsonify({'error': 'Each item must have product_id, product_name, quantity, and unit_price'}), 400
-            
-            if item['quantity'] <= 0 or item['unit_price'] <= 0:
-                return jsonify({'error': 'Quantity and unit_price must be positive'}), 400
-            
-            item_total = item['quantity'] * item['unit_price']
-            total_amount += item_total
-            item['total_price'] = item_total
+            idempotency_key = get_idempotency_key(request.headers)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if idempotency_key:
+            fingerprint = request_fingerprint(data)
+            try:
+                stored = get_stored_response(idempotency_key, fingerprint)
+            except IdempotencyConflict as e:
+                return jsonify({'error': str(e)}), 422
+            if stored:
+                return replay_response(*stored)
+        
+        try:
+            order_type, items_data, total_amount = validate_order_data(data)
+        except OrderValidationError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Create order
         order = Order(
@@ -169,37 +326,36 @@ def create_order():
             db.session.add(order_item)
             order_items.append(order_item)
         
-        db.session.commit()
-        
-        # Send order created message to Kafka
-        order_message = {
-            'order_id': order.id,
-            'order_number': order.order_number,
-            'order_type': order.order_type.value,
-            'customer_name': order.customer_name,
-            'customer_email': order.customer_email,
-            'total_amount': float(order.total_amount),
-            'order_items': [
-                {
-                    'product_id': item.product_id,
-                    'product_name': item.product_name,
-                    'quantity': item.quantity,
-                    'unit_price': float(item.unit_price),
-                    'total_price': float(item.total_price)
-                }
-                for item in order_items
-            ],
-            'created_at': order.created_at.isoformat()
-        }
-        
-        kafka_client.send_message(Topics.ORDER_CREATED, order_message)
+        # Stage the order created event in the same transaction as the order;
+        # the outbox relay publishes it to Kafka after commit
+        order_message = build_order_created_message(order.to_dict(), items_data)
         
-        logger.info(f"Created order: {order.order_number}")
+        add_outbox_event(Topics.ORDER_CREATED, order_message, key=str(order.id))
+        order_stats.record_order_created(order)
         
         # Prepare response
+        db.session.flush()  # Get order item IDs
         order_data = order.to_dict()
         order_data['items'] = [item.to_dict() for item in order_items]
         
+        if idempotency_key:
+            stage_response(idempotency_key, fingerprint, order_data, 201)
+        
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            stored = get_stored_response(idempotency_key, fingerprint) if idempotency_key else None
+            if not stored:
+                raise
+            # A concurrent retry with the same key committed first
+            return replay_response(*stored)
+        
+        logger.info(f"Created order: {order.order_number}")
+        
+        if idempotency_key:
+            purge_expired_keys()
+        
         return jsonify(order_data), 201
         
     except Exception as e:
@@ -229,12 +385,161 @@ def create_order():
         
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/orders/<int:order_id>/status', methods=['PUT'])
+@bp.route('/orders/bulk', methods=['POST'])
+@validate_json('orders')
+def create_orders_bulk():
+    """Create many orders in one transaction.
+
+    Orders and items are written with multi-row inserts and their
+    ORDER_CREATED events are staged in the outbox together, so the relay
+    publishes them as one producer batch. Invalid orders are reported per
+    index; with "atomic": true any invalid order rejects the whole request.
+    """
+    try:
+        data = request.get_json()
+        orders_data = data['orders']
+        atomic = data.get('atomic', False)
+        
+        if not isinstance(atomic, bool):
+            return jsonify({'error': 'atomic must be a boolean'}), 400
+        
+        if not isinstance(orders_data, list) or not orders_data:
+            return jsonify({'error': 'Orders must be a non-empty list'}), 400
+        if len(orders_data) > BULK_MAX_ORDERS:
+            return jsonify({'error': f'At most {BULK_MAX_ORDERS} orders per request'}), 400
+        
+        # Validate every order before touching the database
+        results = [None] * len(orders_data)
+        valid = []
+        for index, order_data in enumerate(orders_data):
+            try:
+                if not isinstance(order_data, dict):
+                    raise OrderValidationError('Order must be an object')
+                missing_fields = [
+                    field for field in ('order_type', 'customer_name', 'items')
+                    if order_data.get(field) is None
+                ]
+                if missing_fields:
+                    raise OrderValidationError(f'Missing required fields: {", ".join(missing_fields)}')
+                
+                order_type, items_data, total_amount = validate_order_data(order_data)
+                valid.append((index, order_data, order_type, items_data, total_amount))
+            except OrderValidationError as e:
+                results[index] = {'index': index, 'status': 'failed', 'error': str(e)}
+            except (TypeError, AttributeError, KeyError):
+                results[index] = {'index': index, 'status': 'failed', 'error': 'Invalid order data'}
+        
+        failed = len(orders_data) - len(valid)
+        if not valid or (atomic and failed):
+            return jsonify({'created': 0, 'failed': failed, 'results': results}), 400
+        
+        now = datetime.utcnow()
+        order_rows = [
+            {
+                'order_number': generate_order_number(),
+                'order_type': order_type,
+                'status': OrderStatus.PENDING,
+                'customer_name': order_data['customer_name'],
+                'customer_email': order_data.get('customer_email'),
+                'total_amount': total_amount,
+                'created_at': now,
+                'updated_at': now
+            }
+            for _, order_data, order_type, _, total_amount in valid
+        ]
+        order_ids = db.session.execute(
+            insert(Order).returning(Order.id, sort_by_parameter_order=True),
+            order_rows
+        ).scalars().all()
+        
+        item_rows = [
+            {
+                'order_id': order_id,
+                'product_id': item['product_id'],
+                'product_name': item['product_name'],
+                'quantity': item['quantity'],
+                'unit_price': item['unit_price'],
+                'total_price': item['total_price']
+            }
+            for order_id, (_, _, _, items_data, _) in zip(order_ids, valid)
+            for item in items_data
+        ]
+        item_ids = iter(db.session.execute(
+            insert(OrderItem).returning(OrderItem.id, sort_by_parameter_order=True),
+            item_rows
+        ).scalars().all())
+        
+        events = []
+        transitions = []
+        for order_id, order_row, (index, _, order_type, items_data, total_amount) in zip(order_ids, order_rows, valid):
+            order_response = {
+                'id': order_id,
+                'order_number': order_row['order_number'],
+                'order_type': order_type.value,
+                'status': OrderStatus.PENDING.value,
+                'customer_name': order_row['customer_name'],
+                'customer_email': order_row['customer_email'],
+                'total_amount': float(total_amount),
+                'created_at': now.isoformat(),
+                'updated_at': now.isoformat(),
+                'processed_at': None
+            }
+            order_response['items'] = [
+                {
+                    'id': next(item_ids),
+                    'order_id': order_id,
+                    'product_id': item['product_id'],
+                    'product_name': item['product_name'],
+                    'quantity': item['quantity'],
+                    'unit_price': float(item['unit_price']),
+                    'total_price': float(item['total_price'])
+                }
+                for item in items_data
+            ]
+            
+            events.append((Topics.ORDER_CREATED, build_order_created_message(order_response, items_data), str(order_id)))
+            transitions.append((order_type, None, OrderStatus.PENDING, total_amount))
+            results[index] = {'index': index, 'status': 'created', 'order': order_response}
+        
+        add_outbox_events(events)
+        order_stats.record_status_transitions(transitions)
+        
+        db.session.commit()
+        
+        logger.info(f"Created {len(valid)} orders in bulk ({failed} rejected)")
+        
+        return jsonify({
+            'created': len(valid),
+            'failed': failed,
+            'results': results
+        }), 201 if not failed else 207
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error creating orders in bulk: {e}")
+        
+        # Send error alert to Kafka for monitoring
+        error_message = {
+            'service': 'orders-service',
+            'endpoint': '/orders/bulk',
+            'method': 'POST',
+            'error_type': 'bulk_order_creation_failed',
+            'error_message': str(e),
+            'timestamp': datetime.utcnow().isoformat(),
+            'severity': 'critical'
+        }
+        kafka_client.send_message(Topics.SYSTEM_ERROR, error_message)
+        
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/orders/<int:order_id>/status', methods=['PUT'])
 @validate_json('status')
 def update_order_status(order_id):
     """Update order status"""
     try:
-        order = Order.query.get(order_id)
+        # Lock the row so a concurrent update or consumer transition can't
+        # move it out of old_status before order_stats records the change
+        order = Order.query.filter_by(id=order_id).with_for_update().first()
         if not order:
             return jsonify({'error': 'Order not found'}), 404
         
@@ -254,6 +559,8 @@ def update_order_status(order_id):
         if new_status == OrderStatus.COMPLETED:
             order.processed_at = datetime.utcnow()
         
+        order_stats.record_status_transitions([(order.order_type, old_status, new_status, order.total_amount)])
+        
         db.session.commit()
         
         # Send status update message to Kafka
@@ -265,7 +572,7 @@ def update_order_status(order_id):
             'updated_at': datetime.utcnow().isoformat()
         }
         
-        kafka_client.send_message(Topics.ORDER_PROCESSED, status_message)
+        kafka_client.send_message(Topics.ORDER_PROCESSED, status_message, key=str(order.id))
         
         logger.info(f"Updated order {order.order_number} status: {old_status.value} -> {new_status.value}")
         
@@ -276,11 +583,12 @@ def update_order_status(order_id):
         logger.error(f"Error updating order {order_id} status: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/orders/<int:order_id>', methods=['DELETE'])
+@bp.route('/orders/<int:order_id>', methods=['DELETE'])
 def cancel_order(order_id):
     """Cancel order (soft delete by setting status to cancelled)"""
     try:
-        order = Order.query.get(order_id)
+        # Locked for the same reason as in update_order_status
+        order = Order.query.filter_by(id=order_id).with_for_update().first()
         if not order:
             return jsonify({'error': 'Order not found'}), 404
         
@@ -291,6 +599,8 @@ def cancel_order(order_id):
         old_status = order.status
         order.status = OrderStatus.CANCELLED
         
+        order_stats.record_status_transitions([(order.order_type, old_status, OrderStatus.CANCELLED, order.total_amount)])
+        
         db.session.commit()
         
         # Send cancellation message to Kafka
@@ -302,7 +612,7 @@ def cancel_order(order_id):
             'cancelled_at': datetime.utcnow().isoformat()
         }
         
-        kafka_client.send_message(Topics.ORDER_PROCESSED, cancellation_message)
+        kafka_client.send_message(Topics.ORDER_PROCESSED, cancellation_message, key=str(order.id))
         
         logger.info(f"Cancelled order: {order.order_number}")
         
@@ -313,47 +623,63 @@ def cancel_order(order_id):
         logger.error(f"Error cancelling order {order_id}: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/orders/stats', methods=['GET'])
+@bp.route('/orders/stats', methods=['GET'])
+@read_only
 def get_order_stats():
-    """Get order statistics"""
+    """Get order statistics from the incrementally maintained counters.
+
+    Pass source=live to compute them from the orders table instead.
+    """
     try:
-        stats = {}
-        
-        # Count orders by status
-        for status in OrderStatus:
-            count = Order.query.filter(Order.status == status).count()
-            stats[f'orders_{status.value}'] = count
-        
-        # Count orders by type
-        for order_type in OrderType:
-            count = Order.query.filter(Order.order_type == order_type).count()
-            stats[f'orders_{order_type.value}'] = count
-        
-        # Total orders
-        stats['total_orders'] = Order.query.count()
-        
-        # Total revenue (completed orders only)
-        completed_orders = Order.query.filter(Order.status == OrderStatus.COMPLETED).all()
-        stats['total_revenue'] = sum(float(order.total_amount) for order in completed_orders)
-        
-        return jsonify(stats), 200
+        live = request.args.get('source') == 'live'
+        return jsonify(order_stats.get_order_stats(live=live)), 200
         
     except Exception as e:
         logger.error(f"Error getting order stats: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-def create_tables():
-    """Create database tables"""
-    with app.app_context():
-        try:
-            db.create_all()
-            logger.info("Database tables created successfully")
-        except Exception as e:
-            logger.error(f"Error creating database tables: {e}")
+def create_app():
+    """Create the orders service WSGI app"""
+    app = Flask(__name__)
+    init_json_provider(app)
+    
+    # Configuration
+    app.config['SQLALCHEMY_DATABASE_URI'] = get_db_uri('orders')
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = get_engine_options()
+    app.config['SQLALCHEMY_BINDS'] = get_binds('orders')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    
+    # Initialize database
+    init_db(app)
+    
+    app.register_blueprint(bp)
+    return app
+
+def create_tables(app):
+    """Bring the database schema up to date with the migrations.
+
+    Failures are re-raised, so the migrate role exits non-zero and the
+    container never starts gunicorn on a partial schema.
+    """
+    try:
+        run_migrations(app)
+        logger.info("Database migrations applied successfully")
+        
+        with app.app_context():
+            order_stats.ensure_order_stats()
+    except Exception as e:
+        logger.error(f"Error applying database migrations: {e}")
+        raise
 
 if __name__ == '__main__':
-    # Create tables
-    create_tables()
+    # Development mode: web server, Kafka consumer and outbox relay in one
+    # process. In production the app runs under gunicorn and the background
+    # work in services.orders.worker.
+    import threading
+    from services.orders.kafka_consumer import start_kafka_consumer_with_app
+    
+    app = create_app()
+    create_tables(app)
     
     # Start Kafka consumer in background thread with app context
     consumer_func = start_kafka_consumer_with_app(app)
@@ -361,5 +687,10 @@ if __name__ == '__main__':
     consumer_thread.start()
     logger.info("Started Kafka consumer thread")
     
+    # Start outbox relay in background thread with app context
+    relay_thread = threading.Thread(target=start_outbox_relay_with_app(app), daemon=True)
+    relay_thread.start()
+    logger.info("Started outbox relay thread")
+    
     # Run Flask app
     app.run(host='0.0.0.0', port=5002, debug=False)
@@ -1,6 +1,9 @@
 import sys
 import threading
-from datetime import datetime
+from collections import defaultdict
+
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
 
 # Add parent directories to path
 sys.path.append('/app')
@@ -9,10 +12,19 @@ sys.path.append('/app/shared')
 from shared.kafka_client import kafka_client, Topics
 from shared.database import db
 from shared.models import Order, OrderStatus
+from shared import order_stats
+from shared.product_cache import product_cache
 from shared.utils import setup_logging
 
 logger = setup_logging('orders-kafka-consumer')
 
+# Inventory response status -> (statuses an order may be in, status it moves to)
+ORDER_TRANSITIONS = {
+    'stock_reserved': ((OrderStatus.PENDING,), OrderStatus.PROCESSING),
+    'stock_updated': ((OrderStatus.PENDING,), OrderStatus.PROCESSING),
+    'stock_reservation_failed': ((OrderStatus.PENDING, OrderStatus.PROCESSING), OrderStatus.FAILED),
+}
+
 def handle_inventory_message(topic: str, message: dict):
     """Handle inventory-related messages"""
     try:
@@ -29,73 +41,121 @@ def handle_stock_update(message: dict):
     """Handle stock update notifications from inventory service"""
     try:
         product_id = message.get('product_id')
-        old_quantity = message.get('old_quantity')
-        new_quantity = message.get('new_quantity')
-        quantity_change = message.get('quantity_change')
-        movement_type = message.get('movement_type')
-        reference_id = message.get('reference_id')
         
-        logger.info(f"Stock update received for product {product_id}: {old_quantity} -> {new_quantity} (change: {quantity_change}, type: {movement_type})")
+        logger.info("Stock update received for product %s: %s -> %s (change: %s, type: %s, reference: %s)",
+                    product_id, message.get('old_quantity'), message.get('new_quantity'),
+                    message.get('quantity_change'), message.get('movement_type'), message.get('reference_id'))
         
-        # If this stock update is related to an order (has reference_id)
-        if reference_id and reference_id.isdigit():
-            order_id = int(reference_id)
-            order = Order.query.get(order_id)
-            
-            if order:
-                logger.info(f"Stock update for order {order.order_number} processed")
-                
-                # You could add additional logic here to update order status
-                # based on stock movements
+        # Drop the product from the shared cache in case the writer couldn't
+        product_cache.invalidate(product_id)
                 
     except Exception as e:
         logger.error(f"Error processing stock update message: {e}")
 
+def handle_inventory_batch(messages: list):
+    """Handle a batch of inventory-related messages"""
+    order_processed_messages = []
+
+    for topic, message in messages:
+        if topic == Topics.STOCK_UPDATE:
+            handle_stock_update(message)
+        elif topic == Topics.ORDER_PROCESSED:
+            order_processed_messages.append(message)
+        else:
+            logger.warning(f"Unknown topic: {topic}")
+
+    if order_processed_messages:
+        handle_order_processed_batch(order_processed_messages)
+
 def handle_order_processed_response(message: dict):
     """Handle responses from inventory service about order processing"""
-    try:
+    handle_order_processed_batch([message])
+
+def handle_order_processed_batch(messages: list):
+    """Apply a batch of inventory responses as set-based status transitions.
+
+    Responses are grouped by transition and each group is applied with one
+    UPDATE ... WHERE id IN (...) AND status = ... RETURNING, so orders are
+    never loaded and an order that is no longer in a source status is left
+    alone. Messages without an order id or with an unknown status are
+    rejected without touching the database. The orders service's own status
+    change and cancellation events (which carry new_status instead of
+    status) are skipped. When one order has several responses in the batch
+    they are applied in order, one round each.
+
+    Returns {'applied': n, 'rejected': n}. Database connection errors are
+    raised, so the consumer redelivers the batch later.
+    """
+    rounds = []  # rounds[n]: transition -> ids of orders whose (n+1)-th response it is
+    responses_per_order = defaultdict(int)
+    rejected = 0
+
+    for message in messages:
         order_id = message.get('order_id')
         status = message.get('status')
-        errors = message.get('errors', [])
-    
+        if status is None and 'new_status' in message:
+            # Published by update_order_status/cancel_order after applying the change
+            continue
         if not order_id:
             logger.error("Received order processed message without order_id")
-            return
-        
-        order = Order.query.get(order_id)
-        if not order:
-            logger.error(f"Order {order_id} not found")
-            return
-            
-        logger.info(f"Received inventory response for order {order.order_number}: {status}")
-            
-            # Update order status based on inventory service response
-        if status == 'stock_reserved':
-            # Stock successfully reserved for sell order
-            if order.status == OrderStatus.PENDING:
-                order.status = OrderStatus.PROCESSING
-                db.session.commit()
-                logger.info(f"Order {order.order_number} moved to PROCESSING status")
-                    
-            elif status == 'stock_updated':
-                # Stock updated for buy order
-                if order.status == OrderStatus.PENDING:
-                    order.status = OrderStatus.PROCESSING
-                    db.session.commit()
-                    logger.info(f"Buy order {order.order_number} moved to PROCESSING status")
-                    
-            elif status == 'stock_reservation_failed':
-                # Stock reservation failed
-                order.status = OrderStatus.FAILED
-                db.session.commit()
-                logger.error(f"Order {order.order_number} failed due to stock issues: {', '.join(errors)}")
-                
-            else:
-                logger.warning(f"Unknown order processing status: {status}")
-                
+            rejected += 1
+            continue
+
+        transition = ORDER_TRANSITIONS.get(status)
+        if not transition:
+            logger.warning(f"Unknown order processing status for order {order_id}: {status}")
+            rejected += 1
+            continue
+
+        if status == 'stock_reservation_failed':
+            logger.error(f"Order {order_id} failed due to stock issues: {', '.join(message.get('errors', []))}")
+
+        round_index = responses_per_order[order_id]
+        responses_per_order[order_id] += 1
+        if round_index == len(rounds):
+            rounds.append(defaultdict(list))
+        rounds[round_index][transition].append(order_id)
+
+    try:
+        transitions = []
+        for pending in rounds:
+            for (from_statuses, to_status), order_ids in pending.items():
+                moved = apply_status_transition(order_ids, from_statuses, to_status)
+                transitions.extend(moved)
+                rejected += len(order_ids) - len(moved)
+
+        if transitions:
+            order_stats.record_status_transitions(transitions)
+            db.session.commit()
+
+    except OperationalError:
+        db.session.rollback()
+        raise
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error processing order processed response: {e}")
+        logger.error(f"Error processing batch of {len(messages)} order processed responses: {e}")
+        return {'applied': 0, 'rejected': rejected}
+
+    logger.info("Applied %s order status transitions, rejected %s", len(transitions), rejected)
+    return {'applied': len(transitions), 'rejected': rejected}
+
+def apply_status_transition(order_ids: list, from_statuses: tuple, to_status: OrderStatus) -> list:
+    """Move the given orders that are in one of from_statuses to to_status.
+
+    Returns a (order_type, old_status, new_status, total_amount) tuple per
+    moved order, as order_stats.record_status_transitions expects.
+    """
+    moved = []
+    for from_status in from_statuses:
+        rows = db.session.execute(
+            update(Order)
+            .where(Order.id.in_(order_ids), Order.status == from_status)
+            .values(status=to_status)
+            .returning(Order.order_type, Order.total_amount)
+            .execution_options(synchronize_session=False)
+        )
+        moved.extend((order_type, from_status, to_status, total_amount) for order_type, total_amount in rows)
+    return moved
 
 def start_kafka_consumer():
     """Start Kafka consumer for orders service"""
@@ -119,11 +179,13 @@ def start_kafka_consumer_with_app(app):
             topics = [Topics.STOCK_UPDATE, Topics.ORDER_PROCESSED]
             group_id = 'orders-service-group'
             
-            def message_handler_with_context(topic: str, message: dict):
+            # Called from the worker threads: each call gets its own app
+            # context and therefore its own DB session
+            def batch_handler_with_context(messages: list):
                 with app.app_context():
-                    handle_inventory_message(topic, message)
+                    handle_inventory_batch(messages)
             
-            kafka_client.consume_messages(topics, group_id, message_handler_with_context)
+            kafka_client.consume_partitioned(topics, group_id, batch_handler_with_context)
             
         except Exception as e:
             logger.error(f"Error in Kafka consumer: {e}")
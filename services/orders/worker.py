@@ -0,0 +1,55 @@
+"""Background processes of the orders service.
+
+The Kafka consumer and the outbox relay run outside the gunicorn web
+workers, so each can be scaled on its own and never competes with HTTP
+requests for the GIL:
+
+    python -m services.orders.worker migrate
+    python -m services.orders.worker consumer
+    python -m services.orders.worker relay
+"""
+import argparse
+import signal
+import sys
+
+# Add parent directories to path to import shared modules
+sys.path.append('/app')
+sys.path.append('/app/shared')
+
+from shared.kafka_client import kafka_client
+from shared.outbox import start_outbox_relay_with_app
+from shared.utils import setup_logging
+from services.orders.app import create_app, create_tables
+from services.orders.kafka_consumer import start_kafka_consumer_with_app
+
+logger = setup_logging('orders-worker')
+
+ROLES = {
+    'consumer': start_kafka_consumer_with_app,
+    'relay': start_outbox_relay_with_app
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('role', choices=['migrate'] + list(ROLES))
+    args = parser.parse_args()
+
+    app = create_app()
+    create_tables(app)
+    if args.role == 'migrate':
+        return
+
+    def shutdown(signum, frame):
+        # The consumer finishes its current batch and commits; the relay
+        # exits right away, unacknowledged events stay pending in the outbox
+        kafka_client.stop()
+        if args.role == 'relay':
+            sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+
+    logger.info(f"Starting orders {args.role}")
+    ROLES[args.role](app)()
+
+if __name__ == '__main__':
+    main()
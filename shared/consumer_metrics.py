@@ -0,0 +1,145 @@
+import os
+import socket
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+
+# Upper bounds of the handler latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+RATE_WINDOW_SECONDS = 60
+
+class LatencyHistogram:
+    """Fixed-bucket histogram of handler latencies"""
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.count = 0
+        self.sum_ms = 0.0
+
+    def observe(self, latency_ms: float):
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum_ms += latency_ms
+
+    def percentile(self, fraction: float):
+        """Upper bound of the bucket holding the given fraction of observations"""
+        if not self.count:
+            return None
+        target = fraction * self.count
+        seen = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return bound if bound != float('inf') else None
+        return None
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'avg_ms': round(self.sum_ms / self.count, 3) if self.count else None,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'buckets': {
+                ('le_inf' if bound == float('inf') else f'le_{bound}'): bucket_count
+                for bound, bucket_count in zip(LATENCY_BUCKETS_MS, self.counts)
+            }
+        }
+
+class PartitionMetrics:
+    """Counters for one topic partition"""
+
+    def __init__(self):
+        self.messages = 0
+        self.errors = 0
+        self.lag = None
+        self.latency = LatencyHistogram()
+        self.window = deque()  # (timestamp, message count) within the rate window
+
+    def messages_per_second(self, now: float):
+        while self.window and now - self.window[0][0] > RATE_WINDOW_SECONDS:
+            self.window.popleft()
+        if not self.window:
+            return 0.0
+        elapsed = max(now - self.window[0][0], 1.0)
+        return round(sum(count for _, count in self.window) / elapsed, 2)
+
+    def to_dict(self, now: float):
+        return {
+            'messages': self.messages,
+            'errors': self.errors,
+            'lag': self.lag,
+            'messages_per_second': self.messages_per_second(now),
+            'handler_latency': self.latency.to_dict()
+        }
+
+class ConsumerMetrics:
+    """Lag, throughput, handler latency and error counts of one consumer group.
+
+    Thread-safe, since partitioned consumers record from their worker threads.
+    """
+
+    def __init__(self, group_id: str):
+        self.group_id = group_id
+        self.client_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.partitions = defaultdict(PartitionMetrics)
+        self.decode_errors = 0
+        self.started_at = datetime.utcnow()
+        self._lock = threading.Lock()
+
+    def record(self, topic: str, partition: int, messages: int, latency_seconds: float, failed: bool = False):
+        """Record one handler call that processed messages from a partition"""
+        now = time.time()
+        with self._lock:
+            metrics = self.partitions[(topic, partition)]
+            metrics.messages += messages
+            metrics.window.append((now, messages))
+            metrics.latency.observe(latency_seconds * 1000)
+            if failed:
+                metrics.errors += messages
+
+    def record_decode_error(self):
+        with self._lock:
+            self.decode_errors += 1
+
+    def update_lag(self, consumer):
+        """Refresh lag from the consumer's high-water marks and positions"""
+        for tp in consumer.assignment():
+            highwater = consumer.highwater(tp)
+            if highwater is None:
+                continue
+            try:
+                lag = max(highwater - consumer.position(tp), 0)
+            except Exception:
+                continue
+            with self._lock:
+                self.partitions[(tp.topic, tp.partition)].lag = lag
+
+    def snapshot(self) -> dict:
+        """Serializable view of the metrics"""
+        now = time.time()
+        with self._lock:
+            partitions = {
+                f"{topic}:{partition}": dict(metrics.to_dict(now), topic=topic, partition=partition)
+                for (topic, partition), metrics in sorted(self.partitions.items())
+            }
+            decode_errors = self.decode_errors
+
+        return {
+            'group_id': self.group_id,
+            'client_id': self.client_id,
+            'timestamp': datetime.utcnow().isoformat(),
+            'started_at': self.started_at.isoformat(),
+            'partitions': partitions,
+            'totals': {
+                'messages': sum(p['messages'] for p in partitions.values()),
+                'errors': sum(p['errors'] for p in partitions.values()) + decode_errors,
+                'decode_errors': decode_errors,
+                'lag': sum(p['lag'] or 0 for p in partitions.values()),
+                'messages_per_second': round(sum(p['messages_per_second'] for p in partitions.values()), 2)
+            }
+        }
@@ -1,16 +1,91 @@
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+from flask_sqlalchemy.session import Session
+from flask_migrate import Migrate, stamp, upgrade
+from contextlib import contextmanager
+from functools import wraps
+from sqlalchemy import inspect, text
+import logging
 import os
+import threading
+import time
 
-db = SQLAlchemy()
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+BASELINE_REVISION = '0001'
+# pg_advisory_lock key held while migrating, so processes starting together take turns
+MIGRATION_LOCK_ID = 72_001
+
+# Bind key of the optional read replica
+REPLICA_BIND = 'replica'
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', '5'))
+DB_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_LAG_CHECK_INTERVAL', '5'))
+
+# Zero on a primary or a standby that replayed everything it received,
+# otherwise the age of the last replayed transaction
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+
+class RoutingSession(Session):
+    """Session that sends the reads of read-only requests to the replica.
+
+    Requests opt in with the read_only decorator; flushes and every other
+    request keep using the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get(REPLICA_BIND) and not self._flushing:
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 
+_replica_health = {}  # replica URL -> (checked at, usable)
+_replica_lock = threading.Lock()
+
 def init_db(app):
     """Initialize database with Flask app"""
     db.init_app(app)
     migrate.init_app(app, db)
     return db
 
+@contextmanager
+def migration_lock(engine):
+    """Hold a PostgreSQL advisory lock for the duration of a migration"""
+    if engine.dialect.name != 'postgresql':
+        yield
+        return
+
+    # Autocommit, so the lock connection doesn't hold a transaction open
+    # while indexes are built concurrently
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        connection.execute(text('SELECT pg_advisory_lock(:id)'), {'id': MIGRATION_LOCK_ID})
+        try:
+            yield
+        finally:
+            connection.execute(text('SELECT pg_advisory_unlock(:id)'), {'id': MIGRATION_LOCK_ID})
+
+def run_migrations(app, revision='head'):
+    """Upgrade the service database to the given migration revision.
+
+    Databases created with db.create_all() before migrations existed have
+    tables but no alembic_version; they are stamped at the baseline first.
+    Safe to call from several processes at once.
+    """
+    with app.app_context(), migration_lock(db.engine):
+        tables = inspect(db.engine).get_table_names()
+        if 'alembic_version' not in tables and 'orders' in tables:
+            stamp(directory=MIGRATIONS_DIR, revision=BASELINE_REVISION)
+        upgrade(directory=MIGRATIONS_DIR, revision=revision)
+
 def get_db_uri(service_name):
     """Get database URI for a specific service"""
     host = os.getenv('POSTGRES_HOST', 'postgres')
@@ -20,3 +95,83 @@ def get_db_uri(service_name):
     db_name = f"{service_name}_db"
     
     return f"postgresql://{user}:{password}@{host}:{port}/{db_name}"
+
+def get_replica_uri(service_name):
+    """Get the read replica URI for a service, or None when no replica is configured"""
+    host = os.getenv('POSTGRES_REPLICA_HOST')
+    if not host:
+        return None
+
+    port = os.getenv('POSTGRES_REPLICA_PORT', os.getenv('POSTGRES_PORT', '5432'))
+    user = os.getenv('POSTGRES_USER', 'postgres')
+    password = os.getenv('POSTGRES_PASSWORD', 'postgres')
+    db_name = f"{service_name}_db"
+
+    return f"postgresql://{user}:{password}@{host}:{port}/{db_name}"
+
+def get_engine_options():
+    """Connection pool settings shared by the primary and replica engines"""
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '20')),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '30')),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    }
+
+def get_binds(service_name):
+    """SQLALCHEMY_BINDS for a service: the replica bind when one is configured"""
+    replica_uri = get_replica_uri(service_name)
+    if not replica_uri:
+        return {}
+    return {REPLICA_BIND: dict(get_engine_options(), url=replica_uri)}
+
+def get_replica_lag(engine):
+    """Replication lag of the replica in seconds, or None if it can't be determined"""
+    if engine.dialect.name != 'postgresql':
+        return 0.0
+    try:
+        with engine.connect() as connection:
+            lag = connection.execute(REPLICA_LAG_SQL).scalar()
+        return float(lag) if lag is not None else None
+    except Exception as e:
+        logger.warning(f"Replica lag check failed: {e}")
+        return None
+
+def replica_available():
+    """Whether reads may go to the replica.
+
+    The replica must be configured and lag behind the primary by at most
+    DB_REPLICA_MAX_LAG_SECONDS. The verdict is cached for
+    DB_REPLICA_LAG_CHECK_INTERVAL seconds so requests don't pay for the check.
+    """
+    engine = db.engines.get(REPLICA_BIND)
+    if engine is None:
+        return False
+
+    key = str(engine.url)
+    now = time.monotonic()
+    with _replica_lock:
+        checked_at, usable = _replica_health.get(key, (None, False))
+        if checked_at is not None and now - checked_at < DB_REPLICA_LAG_CHECK_INTERVAL:
+            return usable
+        # Other requests keep the previous verdict while this one checks
+        _replica_health[key] = (now, usable)
+
+    lag = get_replica_lag(engine)
+    usable = lag is not None and lag <= DB_REPLICA_MAX_LAG_SECONDS
+    if lag is not None and not usable:
+        logger.warning(f"Replica lag {lag:.1f}s exceeds {DB_REPLICA_MAX_LAG_SECONDS}s, reading from primary")
+
+    with _replica_lock:
+        _replica_health[key] = (time.monotonic(), usable)
+    return usable
+
+def read_only(view):
+    """Route the queries of a read-only endpoint to the replica when it is usable"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # The session lives for the app context, so streamed responses keep the routing
+        db.session.info[REPLICA_BIND] = replica_available()
+        return view(*args, **kwargs)
+    return wrapper
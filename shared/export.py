@@ -0,0 +1,56 @@
+import csv
+import io
+import json
+import os
+
+from flask import Response, stream_with_context
+
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '1000'))
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+def stream_export(rows, export_format: str, columns: list, filename: str) -> Response:
+    """Stream dict rows as NDJSON or CSV in chunks.
+
+    rows should be a lazy iterable (e.g. a query run with yield_per) so that
+    neither the database results nor the response body are ever held in
+    memory at once.
+    """
+    if export_format == 'csv':
+        generate = _csv_chunks(rows, columns)
+        mimetype = 'text/csv'
+    else:
+        generate = _ndjson_chunks(rows)
+        mimetype = 'application/x-ndjson'
+
+    response = Response(stream_with_context(generate), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}.{export_format}'
+    response.headers['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the whole export
+    return response
+
+def _ndjson_chunks(rows):
+    buffer = []
+    for row in rows:
+        buffer.append(json.dumps(row, default=str))
+        if len(buffer) >= EXPORT_CHUNK_SIZE:
+            yield '\n'.join(buffer) + '\n'
+            buffer = []
+    if buffer:
+        yield '\n'.join(buffer) + '\n'
+
+def _csv_chunks(rows, columns: list):
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= EXPORT_CHUNK_SIZE:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+            pending = 0
+
+    if output.tell():
+        yield output.getvalue()
@@ -0,0 +1,25 @@
+"""Gunicorn settings shared by the HTTP services, configured from the environment.
+
+    gunicorn --config python:shared.gunicorn_config 'services.orders.app:create_app()'
+
+Every worker process opens its own database pool, so GUNICORN_WORKERS x
+(DB_POOL_SIZE + DB_MAX_OVERFLOW) must fit within the server's max_connections.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('GUNICORN_WORKERS', str(multiprocessing.cpu_count() * 2 + 1)))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_class = 'gthread'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# Recycle workers now and then to cap slow memory growth
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '10000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '1000'))
+
+accesslog = '-' if os.getenv('GUNICORN_ACCESS_LOG', 'false').lower() == 'true' else None
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'INFO').lower()
@@ -0,0 +1,64 @@
+import hashlib
+import os
+
+from flask import current_app, jsonify, request
+from sqlalchemy import func, select
+
+from shared.database import db
+
+# Seconds clients (and nginx, for public resources) may reuse a response before revalidating
+HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', '5'))
+
+def make_etag(*parts) -> str:
+    """Strong ETag value built from the parts that identify a resource version"""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+def row_etag(table: str, row_id, updated_at: str) -> str:
+    """ETag of a single row, from its id and ISO 8601 updated_at"""
+    return make_etag(f'{table}:{row_id}', updated_at)
+
+def resource_etag(resource) -> str:
+    """ETag of a model instance"""
+    return row_etag(type(resource).__tablename__, resource.id, resource.updated_at.isoformat())
+
+def _criterion_key(criterion) -> str:
+    """SQL of a filter expression with its bound values, so filters that only differ in values don't collide"""
+    compiled = criterion.compile()
+    return f'{compiled}{sorted(compiled.params.items())}'
+
+def collection_etag(model, *criteria) -> str:
+    """ETag of the rows of a model matching criteria, from one aggregate query.
+
+    Every write bumps updated_at, and rows only enter or leave a collection
+    through a write, so count and max(updated_at) change whenever its
+    contents do.
+    """
+    count, last_updated = db.session.execute(
+        select(func.count(model.id), func.max(model.updated_at)).where(*criteria)
+    ).one()
+    return make_etag(
+        model.__tablename__,
+        *(_criterion_key(criterion) for criterion in criteria),
+        count,
+        last_updated.isoformat() if last_updated else None
+    )
+
+def cache_control(private: bool = False) -> str:
+    """Cache-Control value; private responses are kept out of shared caches like nginx"""
+    scope = 'private' if private else 'public'
+    return f'{scope}, max-age={HTTP_CACHE_MAX_AGE}, must-revalidate'
+
+def conditional_response(etag: str, build, private: bool = False):
+    """Answer a GET with 304 if If-None-Match matches etag, otherwise with build()'s JSON.
+
+    build is only called when the body is needed, so unchanged resources
+    skip loading and serializing it.
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control(private)
+    return response
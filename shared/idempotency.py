@@ -0,0 +1,98 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import jsonify
+
+from shared.database import db
+from shared.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_REPLAYED_HEADER = 'Idempotent-Replayed'
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_TTL_HOURS', '24'))
+IDEMPOTENCY_PURGE_INTERVAL = int(os.getenv('IDEMPOTENCY_PURGE_INTERVAL', '300'))  # seconds
+
+_last_purge = 0.0
+_purge_lock = threading.Lock()
+
+class IdempotencyConflict(Exception):
+    """The Idempotency-Key was already used for a different request"""
+
+def get_idempotency_key(headers):
+    """Read and validate the Idempotency-Key header; None when it wasn't sent"""
+    key = headers.get(IDEMPOTENCY_KEY_HEADER)
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise ValueError(f'{IDEMPOTENCY_KEY_HEADER} must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters')
+    return key
+
+def request_fingerprint(data) -> str:
+    """Hash of the request body, to detect a key reused for another request"""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def get_stored_response(key: str, fingerprint: str):
+    """Return the stored (response, status_code) for a key, or None if there is none.
+
+    Expired entries are dropped so the key can be used again.
+    """
+    entry = db.session.get(IdempotencyKey, key)
+    if entry is None:
+        return None
+
+    if entry.expires_at <= datetime.utcnow():
+        db.session.delete(entry)
+        db.session.flush()
+        return None
+
+    if entry.request_hash != fingerprint:
+        raise IdempotencyConflict(f'{IDEMPOTENCY_KEY_HEADER} {key} was already used for a different request')
+    return entry.response, entry.status_code
+
+def replay_response(response: dict, status_code: int):
+    """Flask response for a stored result, flagged as a replay"""
+    return jsonify(response), status_code, {IDEMPOTENCY_REPLAYED_HEADER: 'true'}
+
+def stage_response(key: str, fingerprint: str, response: dict, status_code: int):
+    """Store a response in the current transaction, so it commits with the write it describes"""
+    now = datetime.utcnow()
+    db.session.add(IdempotencyKey(
+        key=key,
+        request_hash=fingerprint,
+        status_code=status_code,
+        response=response,
+        created_at=now,
+        expires_at=now + timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    ))
+
+def purge_expired_keys():
+    """Delete expired keys, at most once per IDEMPOTENCY_PURGE_INTERVAL per process"""
+    global _last_purge
+
+    with _purge_lock:
+        if time.time() - _last_purge < IDEMPOTENCY_PURGE_INTERVAL:
+            return 0
+        _last_purge = time.time()
+
+    try:
+        deleted = (
+            IdempotencyKey.query
+            .filter(IdempotencyKey.expires_at <= datetime.utcnow())
+            .delete(synchronize_session=False)
+        )
+        db.session.commit()
+        if deleted:
+            logger.info(f"Purged {deleted} expired idempotency keys")
+        return deleted
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error purging idempotency keys: {e}")
+        return 0
@@ -0,0 +1,66 @@
+import logging
+import os
+from datetime import date
+from decimal import Decimal
+from enum import Enum
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# orjson (default when installed) or default (Flask's json-based provider)
+JSON_PROVIDER = os.getenv('JSON_PROVIDER', 'orjson').lower()
+
+def _default(value):
+    """Encode the column types returned by the row serializers the way to_dict() does"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, date):
+        return value.isoformat()
+    return DefaultJSONProvider.default(value)
+
+class StandardJSONProvider(DefaultJSONProvider):
+    """Flask's json provider, encoding datetimes as ISO 8601, Decimals as floats and enums by value"""
+    default = staticmethod(_default)
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson.
+
+    Datetimes, enums and UUIDs are encoded natively and Decimals through
+    _default, with the same output as StandardJSONProvider, so endpoints can
+    return raw column values without converting them row by row first.
+    """
+    option = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def dumps(self, obj, **kwargs) -> str:
+        option = self.option | (orjson.OPT_INDENT_2 if kwargs.get('indent') else 0)
+        return orjson.dumps(obj, default=_default, option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+
+        # Hand the bytes straight to the response instead of a str that gets encoded again
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=self.option | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+def init_json_provider(app):
+    """Register the fastest available JSON provider on a Flask app"""
+    if JSON_PROVIDER == 'orjson' and orjson is not None:
+        app.json = OrjsonProvider(app)
+    else:
+        if JSON_PROVIDER == 'orjson':
+            logger.warning("orjson is not installed, using the standard JSON provider")
+        app.json = StandardJSONProvider(app)
+    return app.json
@@ -1,9 +1,17 @@
-from kafka import KafkaProducer, KafkaConsumer
+from kafka import KafkaProducer, KafkaConsumer, TopicPartition
 from kafka.errors import KafkaError
-import json
+import atexit
 import logging
 import os
-from typing import Dict, Any, Callable
+import queue
+import threading
+import time
+import zlib
+from typing import Dict, Any, Callable, Optional
+
+from shared.message_codecs import get_codec, envelope_headers, decode_message
+from shared.consumer_metrics import ConsumerMetrics
+from shared.utils import PAYLOAD
 
 logger = logging.getLogger(__name__)
 
@@ -12,69 +20,425 @@ class KafkaClient:
         self.bootstrap_servers = os.getenv('KAFKA_BOOTSTRAP_SERVERS', 'kafka:9092')
         self.producer = None
         self.consumer = None
-    
+
+        # Wire format: consumers detect the codec from the message headers
+        self.codec = get_codec(os.getenv('KAFKA_CODEC', 'json'))
+        self.headers = envelope_headers(self.codec)
+        self.compression_type = os.getenv('KAFKA_COMPRESSION') or None
+
+        # Producer tuning for the non-blocking send path
+        self.linger_ms = int(os.getenv('KAFKA_LINGER_MS', '5'))
+        self.batch_size = int(os.getenv('KAFKA_BATCH_SIZE', '32768'))
+        self.max_in_flight = int(os.getenv('KAFKA_MAX_IN_FLIGHT', '1000'))
+        self.in_flight_timeout = float(os.getenv('KAFKA_IN_FLIGHT_TIMEOUT', '5'))
+        self.send_timeout = float(os.getenv('KAFKA_SEND_TIMEOUT', '10'))
+
+        # Batch consumption defaults
+        self.batch_max_records = int(os.getenv('KAFKA_BATCH_MAX_RECORDS', '500'))
+        self.batch_timeout_ms = int(os.getenv('KAFKA_BATCH_TIMEOUT_MS', '200'))
+        self.consumer_workers = int(os.getenv('KAFKA_CONSUMER_WORKERS', '4'))
+
+        # Backoff before a failed batch is redelivered, doubling per consecutive failure
+        self.retry_backoff = float(os.getenv('KAFKA_RETRY_BACKOFF', '1'))
+        self.retry_backoff_max = float(os.getenv('KAFKA_RETRY_BACKOFF_MAX', '30'))
+
+        # Consumer health metrics, published periodically for the monitor service
+        self.metrics = {}  # group_id -> ConsumerMetrics
+        self.metrics_interval = float(os.getenv('KAFKA_METRICS_INTERVAL', '15'))
+
+        self._producer_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        atexit.register(self.flush)
+
     def get_producer(self):
         """Get Kafka producer instance"""
         if not self.producer:
-            self.producer = KafkaProducer(
-                bootstrap_servers=self.bootstrap_servers,
-                value_serializer=lambda v: json.dumps(v).encode('utf-8'),
-                key_serializer=lambda k: k.encode('utf-8') if k else None,
-                acks='all',
-                retries=3,
-                retry_backoff_ms=1000
-            )
+            with self._producer_lock:
+                if not self.producer:
+                    self.producer = KafkaProducer(
+                        bootstrap_servers=self.bootstrap_servers,
+                        value_serializer=self.codec.encode,
+                        key_serializer=lambda k: k.encode('utf-8') if k else None,
+                        compression_type=self.compression_type,
+                        acks='all',
+                        retries=3,
+                        retry_backoff_ms=1000,
+                        linger_ms=self.linger_ms,
+                        batch_size=self.batch_size
+                    )
         return self.producer
-    
-    def get_consumer(self, topics: list, group_id: str):
+
+    def get_consumer(self, topics: list, group_id: str, enable_auto_commit: bool = True):
         """Get Kafka consumer instance"""
         return KafkaConsumer(
             *topics,
             bootstrap_servers=self.bootstrap_servers,
             group_id=group_id,
-            value_deserializer=lambda m: json.loads(m.decode('utf-8')),
             auto_offset_reset='earliest',
-            enable_auto_commit=True
+            enable_auto_commit=enable_auto_commit
         )
-    
-    def send_message(self, topic: str, message: Dict[Any, Any], key: str = None):
-        """Send message to Kafka topic"""
+
+    def send_message(self, topic: str, message: Dict[Any, Any], key: str = None, sync: bool = False,
+                     on_success: Optional[Callable] = None, on_error: Optional[Callable] = None):
+        """Send message to Kafka topic.
+
+        By default the message is handed to the producer's batching buffer and
+        the call returns immediately; delivery is reported through the optional
+        on_success(metadata) / on_error(exception) callbacks. Pass sync=True to
+        wait for the broker acknowledgement instead.
+        """
+        if sync:
+            return self._send_sync(topic, message, key)
+
+        if not self._in_flight.acquire(timeout=self.in_flight_timeout):
+            logger.error(f"Failed to send message to topic {topic}: too many messages in flight ({self.max_in_flight})")
+            return False
+
+        try:
+            producer = self.get_producer()
+            future = producer.send(topic, value=message, key=key, headers=self.headers)
+        except Exception as e:
+            self._in_flight.release()
+            logger.error(f"Failed to send message to topic {topic}: {e}")
+            return False
+
+        def handle_success(metadata):
+            self._in_flight.release()
+            logger.debug("Message delivered to topic %s: %s", topic, metadata)
+            if on_success:
+                on_success(metadata)
+
+        def handle_error(exc):
+            self._in_flight.release()
+            logger.error(f"Failed to deliver message to topic {topic}: {exc}")
+            if on_error:
+                on_error(exc)
+
+        future.add_callback(handle_success)
+        future.add_errback(handle_error)
+        return True
+
+    def _send_sync(self, topic: str, message: Dict[Any, Any], key: str = None):
+        """Send message and block until the broker acknowledges it"""
         try:
             producer = self.get_producer()
-            future = producer.send(topic, value=message, key=key)
-            result = future.get(timeout=10)
-            logger.info(f"Message sent to topic {topic}: {result}")
+            future = producer.send(topic, value=message, key=key, headers=self.headers)
+            result = future.get(timeout=self.send_timeout)
+            logger.info("Message sent to topic %s: %s", topic, result)
             return True
         except KafkaError as e:
             logger.error(f"Failed to send message to topic {topic}: {e}")
             return False
-    
+
+    def send_batch(self, messages: list):
+        """Send a list of (topic, message, key) tuples as one producer batch.
+
+        Returns a list of booleans, one per message, telling whether the
+        broker acknowledged it.
+        """
+        futures = []
+        try:
+            producer = self.get_producer()
+            for topic, message, key in messages:
+                try:
+                    futures.append(producer.send(topic, value=message, key=key, headers=self.headers))
+                except Exception as e:
+                    logger.error(f"Failed to send message to topic {topic}: {e}")
+                    futures.append(None)
+            producer.flush(timeout=self.send_timeout)
+        except KafkaError as e:
+            logger.error(f"Failed to send batch of {len(messages)} messages: {e}")
+
+        results = []
+        for future in futures:
+            try:
+                results.append(future is not None and bool(future.get(timeout=0)))
+            except Exception as e:
+                logger.error(f"Message in batch was not delivered: {e}")
+                results.append(False)
+        results.extend([False] * (len(messages) - len(results)))
+        return results
+
+    def flush(self, timeout: float = None):
+        """Block until all buffered messages have been delivered"""
+        if self.producer:
+            try:
+                self.producer.flush(timeout=timeout)
+            except KafkaError as e:
+                logger.error(f"Failed to flush Kafka producer: {e}")
+
     def consume_messages(self, topics: list, group_id: str, message_handler: Callable):
         """Consume messages from Kafka topics"""
         consumer = self.get_consumer(topics, group_id)
+        metrics = self.get_metrics(group_id)
+        last_published = time.time()
         logger.info(f"Started consuming from topics {topics} with group {group_id}")
-        
+
         try:
             for message in consumer:
+                if self._stopped.is_set():
+                    break
+                for _, value in self._decode_records({None: [message]}, metrics):
+                    logger.info("Received message from topic %s: %s", message.topic, value, extra=PAYLOAD)
+                    self._run_handler(
+                        metrics, [(message, value)],
+                        lambda: message_handler(message.topic, value)
+                    )
+                last_published = self._maybe_publish_metrics(consumer, metrics, last_published)
+        except KeyboardInterrupt:
+            logger.info("Consumer interrupted")
+        finally:
+            consumer.close()
+
+    def consume_batches(self, topics: list, group_id: str, batch_handler: Callable,
+                        max_records: int = None, timeout_ms: int = None):
+        """Consume messages from Kafka topics in batches.
+
+        Polls up to max_records messages or waits up to timeout_ms, whichever
+        comes first, and hands the batch to batch_handler as a list of
+        (topic, message) tuples. Offsets are committed once the handler
+        returns, so a crash mid-batch redelivers the whole batch. If the
+        handler raises, the batch is not acknowledged: the consumer seeks
+        back to its first offsets and it is redelivered after a backoff.
+        """
+        max_records = max_records or self.batch_max_records
+        timeout_ms = timeout_ms or self.batch_timeout_ms
+
+        consumer = self.get_consumer(topics, group_id, enable_auto_commit=False)
+        metrics = self.get_metrics(group_id)
+        last_published = time.time()
+        logger.info(f"Started batch consuming from topics {topics} with group {group_id} "
+                    f"(max_records={max_records}, timeout_ms={timeout_ms})")
+
+        failures = 0  # consecutive failed batches
+        try:
+            while not self._stopped.is_set():
+                records = consumer.poll(timeout_ms=timeout_ms, max_records=max_records)
+                last_published = self._maybe_publish_metrics(consumer, metrics, last_published)
+                if not records:
+                    continue
+
+                entries = list(self._decode_records(records, metrics))
+                logger.debug("Received batch of %d messages", len(entries))
+
+                succeeded = self._run_handler(
+                    metrics, entries,
+                    lambda: batch_handler([(message.topic, value) for message, value in entries])
+                )
+
+                if not succeeded:
+                    self._rewind(consumer, records, records.keys())
+                    failures += 1
+                    self._stopped.wait(self._backoff(failures))
+                    continue
+
+                failures = 0
+                consumer.commit()
+                metrics.update_lag(consumer)
+        except KeyboardInterrupt:
+            logger.info("Consumer interrupted")
+        finally:
+            consumer.close()
+
+    def consume_partitioned(self, topics: list, group_id: str, batch_handler: Callable,
+                            workers: int = None, max_records: int = None, timeout_ms: int = None):
+        """Consume message batches with a pool of worker threads.
+
+        Each polled batch is split by message key hash across the workers, so
+        messages with the same key are always handled by the same worker in
+        order while different keys run in parallel. batch_handler receives a
+        list of (topic, message) tuples and is called from the worker threads,
+        so it must set up its own app context and DB session. Offsets are
+        committed once every worker has finished its share of the batch.
+        Partitions with messages in a share whose handler raised are not
+        acknowledged: the consumer seeks them back to the batch's first
+        offsets and they are redelivered after a backoff. The successful
+        shares of those partitions are handled again too, so handlers must
+        be idempotent (the inventory consumer skips orders it already
+        applied).
+        """
+        workers = workers or self.consumer_workers
+        max_records = max_records or self.batch_max_records
+        timeout_ms = timeout_ms or self.batch_timeout_ms
+
+        work_queues = [queue.Queue() for _ in range(workers)]
+        metrics = self.get_metrics(group_id)
+        failed_partitions = set()  # partitions of the current batch with a failed share
+        failed_lock = threading.Lock()
+
+        def worker_loop(work_queue: queue.Queue):
+            while True:
+                entries = work_queue.get()
                 try:
-                    logger.info(f"Received message from topic {message.topic}: {message.value}")
-                    message_handler(message.topic, message.value)
-                except Exception as e:
-                    logger.error(f"Error processing message: {e}")
+                    if entries is None:
+                        return
+                    succeeded = self._run_handler(
+                        metrics, entries,
+                        lambda: batch_handler([(message.topic, value) for message, value in entries])
+                    )
+                    if not succeeded:
+                        with failed_lock:
+                            failed_partitions.update(
+                                TopicPartition(message.topic, message.partition) for message, _ in entries
+                            )
+                finally:
+                    work_queue.task_done()
+
+        for index, work_queue in enumerate(work_queues):
+            threading.Thread(
+                target=worker_loop,
+                args=(work_queue,),
+                name=f"{group_id}-worker-{index}",
+                daemon=True
+            ).start()
+
+        consumer = self.get_consumer(topics, group_id, enable_auto_commit=False)
+        logger.info(f"Started partitioned consuming from topics {topics} with group {group_id} "
+                    f"(workers={workers}, max_records={max_records}, timeout_ms={timeout_ms})")
+
+        last_published = time.time()
+        failures = 0  # consecutive batches with a failed share
+        try:
+            while not self._stopped.is_set():
+                records = consumer.poll(timeout_ms=timeout_ms, max_records=max_records)
+                last_published = self._maybe_publish_metrics(consumer, metrics, last_published)
+                if not records:
+                    continue
+
+                failed_partitions.clear()
+                shards = [[] for _ in range(workers)]
+                for message, value in self._decode_records(records, metrics):
+                    shards[self._worker_index(message, workers)].append((message, value))
+
+                for work_queue, shard in zip(work_queues, shards):
+                    if shard:
+                        work_queue.put(shard)
+
+                for work_queue in work_queues:
+                    work_queue.join()
+
+                # Rewound partitions commit their old position, the rest move on
+                if failed_partitions:
+                    self._rewind(consumer, records, failed_partitions)
+                consumer.commit()
+                metrics.update_lag(consumer)
+
+                if failed_partitions:
+                    failures += 1
+                    self._stopped.wait(self._backoff(failures))
+                else:
+                    failures = 0
         except KeyboardInterrupt:
             logger.info("Consumer interrupted")
         finally:
+            for work_queue in work_queues:
+                work_queue.put(None)
             consumer.close()
-    
+
+    def decode(self, message):
+        """Decode a consumed record using the codec named in its headers"""
+        return decode_message(message.value, message.headers)
+
+    def _decode_records(self, records: dict, metrics: ConsumerMetrics = None):
+        """Decode polled records, skipping the ones that cannot be decoded"""
+        for partition_records in records.values():
+            for message in partition_records:
+                try:
+                    yield message, self.decode(message)
+                except Exception as e:
+                    if metrics:
+                        metrics.record_decode_error()
+                    logger.error(f"Skipping undecodable message from topic {message.topic} "
+                                 f"partition {message.partition} offset {message.offset}: {e}")
+
+    def get_metrics(self, group_id: str) -> ConsumerMetrics:
+        """Get the metrics of a consumer group run by this client"""
+        if group_id not in self.metrics:
+            self.metrics[group_id] = ConsumerMetrics(group_id)
+        return self.metrics[group_id]
+
+    def get_metrics_snapshots(self) -> list:
+        """Snapshots of every consumer group run by this client"""
+        return [metrics.snapshot() for metrics in list(self.metrics.values())]
+
+    def _run_handler(self, metrics: ConsumerMetrics, entries: list, handler_call: Callable) -> bool:
+        """Call a handler and record its latency and outcome per partition; False if it raised"""
+        if not entries:
+            return True
+
+        start = time.perf_counter()
+        failed = False
+        try:
+            handler_call()
+        except Exception as e:
+            failed = True
+            logger.error(f"Error processing {len(entries)} messages: {e}")
+        elapsed = time.perf_counter() - start
+
+        per_partition = {}
+        for message, _ in entries:
+            key = (message.topic, message.partition)
+            per_partition[key] = per_partition.get(key, 0) + 1
+        for (topic, partition), count in per_partition.items():
+            metrics.record(topic, partition, count, elapsed, failed)
+        return not failed
+
+    @staticmethod
+    def _rewind(consumer, records: dict, partitions):
+        """Seek partitions back to the first offset polled in records, so that batch is redelivered"""
+        for tp in partitions:
+            if records.get(tp):
+                consumer.seek(tp, records[tp][0].offset)
+
+    def _backoff(self, failures: int) -> float:
+        """Seconds to wait before redelivering after consecutive failed batches"""
+        return min(self.retry_backoff * 2 ** (failures - 1), self.retry_backoff_max)
+
+    def _maybe_publish_metrics(self, consumer, metrics: ConsumerMetrics, last_published: float) -> float:
+        """Publish a metrics snapshot when the interval elapsed; returns the last publish time"""
+        now = time.time()
+        if now - last_published < self.metrics_interval:
+            return last_published
+
+        metrics.update_lag(consumer)
+        self.send_message(Topics.CONSUMER_METRICS, metrics.snapshot(), key=metrics.group_id)
+        return now
+
+    @staticmethod
+    def _worker_index(message, workers: int) -> int:
+        """Pick a worker for a message by key hash, falling back to its partition"""
+        if message.key is None:
+            return message.partition % workers
+        return zlib.crc32(message.key) % workers
+
+    def stop(self):
+        """Ask running consume loops to exit after their current batch"""
+        self._stopped.set()
+
     def close(self):
-        """Close producer and consumer connections"""
+        """Flush pending messages and close producer and consumer connections"""
+        self.stop()
         if self.producer:
+            self.flush(timeout=self.send_timeout)
             self.producer.close()
+            self.producer = None
         if self.consumer:
             self.consumer.close()
 
+def create_kafka_client():
+    """Create the client for the configured backend.
+
+    KAFKA_BACKEND=memory swaps the Kafka cluster for the in-process broker
+    in shared.memory_broker, for benchmarks and tests without a network.
+    """
+    if os.getenv('KAFKA_BACKEND', 'kafka').lower() == 'memory':
+        from shared.memory_broker import InMemoryKafkaClient
+        return InMemoryKafkaClient()
+    return KafkaClient()
+
 # Global instance
-kafka_client = KafkaClient()
+kafka_client = create_kafka_client()
 
 # Kafka topics
 class Topics:
@@ -83,3 +447,4 @@ class Topics:
     ORDER_PROCESSED = 'order-processed'
     HEALTH_CHECK = 'health-check'
     SYSTEM_ERROR = 'system-error'
+    CONSUMER_METRICS = 'consumer-metrics'
@@ -0,0 +1,304 @@
+import itertools
+import logging
+import threading
+import time
+import zlib
+from collections import defaultdict, namedtuple
+from typing import Callable
+
+from kafka import TopicPartition
+
+from shared.kafka_client import KafkaClient
+
+logger = logging.getLogger(__name__)
+
+# Same fields as kafka-python's ConsumerRecord that the services rely on
+ConsumerRecord = namedtuple(
+    'ConsumerRecord',
+    ['topic', 'partition', 'offset', 'timestamp', 'key', 'value', 'headers']
+)
+RecordMetadata = namedtuple('RecordMetadata', ['topic', 'partition', 'offset', 'timestamp'])
+
+class InMemoryBroker:
+    """In-process stand-in for a Kafka cluster.
+
+    Supports topics with a fixed number of partitions, keyed routing,
+    consumer groups with partition assignment and committed offsets. It is
+    meant for benchmarks and deterministic load tests without a network.
+    """
+
+    def __init__(self, default_partitions: int = 3):
+        self.default_partitions = default_partitions
+        self.topics = {}
+        self.committed = {}  # (group_id, TopicPartition) -> next offset to read
+        self.groups = defaultdict(list)  # group_id -> member consumers
+        self._round_robin = defaultdict(itertools.count)
+        self._condition = threading.Condition()
+
+    def create_topic(self, topic: str, partitions: int = None):
+        """Create topic if it doesn't exist yet"""
+        with self._condition:
+            if topic not in self.topics:
+                self.topics[topic] = [[] for _ in range(partitions or self.default_partitions)]
+                self._rebalance_all()
+            return self.topics[topic]
+
+    def partitions_for(self, topic: str) -> list:
+        """Get the partitions of a topic, creating it on first use"""
+        return [TopicPartition(topic, p) for p in range(len(self.create_topic(topic)))]
+
+    def append(self, topic: str, key: bytes, value: bytes, headers: list = None) -> RecordMetadata:
+        """Append a record; keyed records always land on the same partition"""
+        partitions = self.create_topic(topic)
+        with self._condition:
+            if key is None:
+                partition = next(self._round_robin[topic]) % len(partitions)
+            else:
+                partition = zlib.crc32(key) % len(partitions)
+
+            log = partitions[partition]
+            timestamp = int(time.time() * 1000)
+            log.append(ConsumerRecord(topic, partition, len(log), timestamp, key, value, headers or []))
+            self._condition.notify_all()
+            return RecordMetadata(topic, partition, len(log) - 1, timestamp)
+
+    def highwater(self, tp: TopicPartition) -> int:
+        """Offset of the next record that will be written to the partition"""
+        return len(self.topics.get(tp.topic, [[]] * (tp.partition + 1))[tp.partition])
+
+    def join(self, consumer):
+        with self._condition:
+            self.groups[consumer.group_id].append(consumer)
+            self._rebalance(consumer.group_id)
+
+    def leave(self, consumer):
+        with self._condition:
+            members = self.groups[consumer.group_id]
+            if consumer in members:
+                members.remove(consumer)
+                self._rebalance(consumer.group_id)
+
+    def _rebalance_all(self):
+        for group_id in list(self.groups):
+            self._rebalance(group_id)
+
+    def _rebalance(self, group_id: str):
+        """Spread the partitions of the subscribed topics round-robin over the group members"""
+        members = self.groups[group_id]
+        for member in members:
+            member.assigned = set()
+        if not members:
+            return
+
+        topics = sorted({topic for member in members for topic in member.topics})
+        for index, tp in enumerate(
+            TopicPartition(topic, p)
+            for topic in topics
+            for p in range(len(self.topics.get(topic, [])))
+        ):
+            subscribers = [member for member in members if tp.topic in member.topics]
+            if subscribers:
+                subscribers[index % len(subscribers)].assigned.add(tp)
+
+    def fetch(self, consumer, max_records: int, timeout_ms: int) -> dict:
+        """Return up to max_records new records for the consumer's partitions"""
+        deadline = time.time() + (timeout_ms or 0) / 1000.0
+        with self._condition:
+            while True:
+                records = {}
+                remaining = max_records
+                for tp in sorted(consumer.assigned):
+                    if remaining <= 0:
+                        break
+                    position = consumer.position(tp)
+                    log = self.topics[tp.topic][tp.partition]
+                    if position < len(log):
+                        chunk = log[position:position + remaining]
+                        records[tp] = chunk
+                        consumer.positions[tp] = position + len(chunk)
+                        remaining -= len(chunk)
+
+                wait = deadline - time.time()
+                if records or wait <= 0:
+                    return records
+                self._condition.wait(wait)
+
+    def commit(self, group_id: str, offsets: dict):
+        with self._condition:
+            for tp, offset in offsets.items():
+                self.committed[(group_id, tp)] = offset
+
+    def committed_offset(self, group_id: str, tp: TopicPartition) -> int:
+        return self.committed.get((group_id, tp), 0)
+
+    def lag(self, group_id: str) -> dict:
+        """Committed-offset lag per partition of the topics a group subscribes to"""
+        with self._condition:
+            topics = {topic for member in self.groups[group_id] for topic in member.topics}
+            topics.update(tp.topic for group, tp in self.committed if group == group_id)
+            return {
+                TopicPartition(topic, p): len(log) - self.committed_offset(group_id, TopicPartition(topic, p))
+                for topic in sorted(topics)
+                for p, log in enumerate(self.topics.get(topic, []))
+            }
+
+class InMemoryFuture:
+    """Already-resolved stand-in for kafka-python's FutureRecordMetadata"""
+
+    def __init__(self, metadata: RecordMetadata = None, exception: Exception = None):
+        self.metadata = metadata
+        self.exception = exception
+        self.is_done = True
+
+    def succeeded(self):
+        return self.exception is None
+
+    def failed(self):
+        return self.exception is not None
+
+    def get(self, timeout: float = None):
+        if self.exception:
+            raise self.exception
+        return self.metadata
+
+    def add_callback(self, fn: Callable, *args, **kwargs):
+        if self.succeeded():
+            fn(*args, self.metadata, **kwargs)
+        return self
+
+    def add_errback(self, fn: Callable, *args, **kwargs):
+        if self.failed():
+            fn(*args, self.exception, **kwargs)
+        return self
+
+class InMemoryProducer:
+    """Producer with the subset of the KafkaProducer API used by KafkaClient"""
+
+    def __init__(self, broker: InMemoryBroker, value_serializer: Callable = None,
+                 key_serializer: Callable = None, **kwargs):
+        self.broker = broker
+        self.value_serializer = value_serializer
+        self.key_serializer = key_serializer
+
+    def send(self, topic: str, value=None, key=None, headers: list = None):
+        try:
+            if self.value_serializer:
+                value = self.value_serializer(value)
+            if self.key_serializer:
+                key = self.key_serializer(key)
+            return InMemoryFuture(self.broker.append(topic, key, value, headers))
+        except Exception as e:
+            return InMemoryFuture(exception=e)
+
+    def flush(self, timeout: float = None):
+        pass
+
+    def close(self, timeout: float = None):
+        pass
+
+class InMemoryConsumer:
+    """Consumer with the subset of the KafkaConsumer API used by KafkaClient"""
+
+    def __init__(self, broker: InMemoryBroker, topics: list, group_id: str,
+                 enable_auto_commit: bool = True, consumer_timeout_ms: int = None, **kwargs):
+        self.broker = broker
+        self.topics = list(topics)
+        self.group_id = group_id
+        self.enable_auto_commit = enable_auto_commit
+        self.consumer_timeout_ms = consumer_timeout_ms
+        self.assigned = set()
+        self.positions = {}
+        self.closed = False
+
+        for topic in self.topics:
+            broker.create_topic(topic)
+        broker.join(self)
+
+    def assignment(self):
+        return set(self.assigned)
+
+    def position(self, tp: TopicPartition) -> int:
+        if tp not in self.positions:
+            self.positions[tp] = self.broker.committed_offset(self.group_id, tp)
+        return self.positions[tp]
+
+    def highwater(self, tp: TopicPartition) -> int:
+        return self.broker.highwater(tp)
+
+    def seek(self, tp: TopicPartition, offset: int):
+        self.positions[tp] = offset
+
+    def poll(self, timeout_ms: int = 0, max_records: int = None):
+        records = self.broker.fetch(self, max_records or 500, timeout_ms)
+        if records and self.enable_auto_commit:
+            self.commit()
+        return records
+
+    def commit(self, offsets: dict = None):
+        self.broker.commit(self.group_id, offsets or {
+            tp: position for tp, position in self.positions.items() if tp in self.assigned
+        })
+
+    def __iter__(self):
+        while not self.closed:
+            records = self.poll(timeout_ms=self.consumer_timeout_ms or 1000, max_records=1)
+            if not records:
+                if self.consumer_timeout_ms:
+                    return
+                continue
+            for partition_records in records.values():
+                yield from partition_records
+
+    def close(self, autocommit: bool = True):
+        if not self.closed:
+            if autocommit and self.enable_auto_commit:
+                self.commit()
+            self.closed = True
+            self.broker.leave(self)
+
+# Shared broker for every client in the process
+broker = InMemoryBroker()
+
+class InMemoryKafkaClient(KafkaClient):
+    """KafkaClient backed by the in-process broker instead of a Kafka cluster"""
+
+    def __init__(self, broker: InMemoryBroker = broker):
+        super().__init__()
+        self.broker = broker
+        self.bootstrap_servers = 'memory'
+
+    def get_producer(self):
+        """Get in-memory producer instance"""
+        if not self.producer:
+            self.producer = InMemoryProducer(
+                self.broker,
+                value_serializer=self.codec.encode,
+                key_serializer=lambda k: k.encode('utf-8') if k else None
+            )
+        return self.producer
+
+    def get_consumer(self, topics: list, group_id: str, enable_auto_commit: bool = True):
+        """Get in-memory consumer instance"""
+        return InMemoryConsumer(self.broker, topics, group_id, enable_auto_commit=enable_auto_commit)
+
+    def drain(self, topics: list, group_id: str, batch_handler: Callable, max_records: int = None):
+        """Synchronously hand every pending message to batch_handler.
+
+        Runs in the calling thread and returns the number of messages
+        delivered once the group has caught up, which makes load tests
+        deterministic.
+        """
+        consumer = self.get_consumer(topics, group_id, enable_auto_commit=False)
+        delivered = 0
+        try:
+            while True:
+                records = consumer.poll(timeout_ms=0, max_records=max_records or self.batch_max_records)
+                if not records:
+                    return delivered
+
+                batch = [(message.topic, value) for message, value in self._decode_records(records)]
+                batch_handler(batch)
+                consumer.commit()
+                delivered += len(batch)
+        finally:
+            consumer.close()
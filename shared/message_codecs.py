@@ -0,0 +1,89 @@
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Envelope headers attached to every Kafka message
+CODEC_HEADER = 'codec'
+SCHEMA_VERSION_HEADER = 'schema-version'
+SCHEMA_VERSION = 1
+
+class JsonCodec:
+    """Standard library JSON, the format every service has always used"""
+    name = 'json'
+
+    def encode(self, message) -> bytes:
+        return json.dumps(message).encode('utf-8')
+
+    def decode(self, data: bytes):
+        return json.loads(data.decode('utf-8'))
+
+class OrjsonCodec:
+    """JSON encoded with orjson; the bytes stay readable by JsonCodec"""
+    name = 'orjson'
+
+    def encode(self, message) -> bytes:
+        return orjson.dumps(message)
+
+    def decode(self, data: bytes):
+        return orjson.loads(data)
+
+class MsgpackCodec:
+    """Binary MessagePack encoding, the most compact for large order payloads"""
+    name = 'msgpack'
+
+    def encode(self, message) -> bytes:
+        return msgpack.packb(message, use_bin_type=True)
+
+    def decode(self, data: bytes):
+        return msgpack.unpackb(data, raw=False)
+
+CODECS = {
+    JsonCodec.name: JsonCodec(),
+    OrjsonCodec.name: OrjsonCodec() if orjson else None,
+    MsgpackCodec.name: MsgpackCodec() if msgpack else None,
+}
+
+def get_codec(name: str):
+    """Get codec by name, falling back to JSON if it is unknown or not installed"""
+    codec = CODECS.get((name or JsonCodec.name).lower())
+    if codec is None:
+        logger.warning(f"Codec {name} is not available, falling back to {JsonCodec.name}")
+        return CODECS[JsonCodec.name]
+    return codec
+
+def envelope_headers(codec) -> list:
+    """Build the Kafka headers describing how a message was encoded"""
+    return [
+        (CODEC_HEADER, codec.name.encode('utf-8')),
+        (SCHEMA_VERSION_HEADER, str(SCHEMA_VERSION).encode('utf-8')),
+    ]
+
+def decode_message(data: bytes, headers: list = None):
+    """Decode a message value using the codec named in its headers.
+
+    Messages without envelope headers were produced before codecs existed
+    and are plain UTF-8 JSON, which lets services be upgraded one at a time.
+    """
+    header_values = dict(headers or [])
+
+    version = header_values.get(SCHEMA_VERSION_HEADER)
+    if version is not None and int(version) > SCHEMA_VERSION:
+        raise ValueError(f"Unsupported message schema version: {version.decode('utf-8')}")
+
+    codec_name = header_values.get(CODEC_HEADER, JsonCodec.name.encode('utf-8')).decode('utf-8')
+    codec = CODECS.get(codec_name)
+    if codec is None:
+        raise ValueError(f"Codec {codec_name} is not available to decode message")
+
+    return codec.decode(data)
@@ -16,6 +16,15 @@ class OrderType(Enum):
 # Inventory Service Models
 class Product(db.Model):
     __tablename__ = 'products'
+    __table_args__ = (
+        # Partial index: only the (few) products at or below their reorder level
+        db.Index('ix_products_low_stock', 'id',
+                 postgresql_where=db.text('stock_quantity <= min_stock_level'),
+                 sqlite_where=db.text('stock_quantity <= min_stock_level')),
+        # GET /products?sort=name / sort=price and price range filters (keyset on the sort column, id)
+        db.Index('ix_products_name_id', 'name', 'id'),
+        db.Index('ix_products_price_id', 'price', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -41,8 +50,27 @@ class Product(db.Model):
             'updated_at': self.updated_at.isoformat()
         }
 
+def is_low_stock(stock_quantity: int, min_stock_level) -> bool:
+    """Python twin of the ix_products_low_stock predicate (stock_quantity <= min_stock_level)"""
+    return min_stock_level is not None and stock_quantity <= min_stock_level
+
+# GET /products?name=... (case-insensitive prefix; text_pattern_ops lets LIKE 'x%' use the index under any collation)
+db.Index('ix_products_name_prefix', db.func.lower(Product.name).label('name_lower'),
+         postgresql_ops={'name_lower': 'text_pattern_ops'})
+
+# Movement types the inventory consumer writes for order events, with reference_id = order id
+ORDER_MOVEMENT_TYPES = ('sale_reservation', 'purchase')
+
 class StockMovement(db.Model):
     __tablename__ = 'stock_movements'
+    __table_args__ = (
+        db.Index('ix_stock_movements_product_id_created_at', 'product_id', 'created_at'),
+        # At most one movement per order and product, so a redelivered order event can't apply twice
+        db.Index('ux_stock_movements_order_reference', 'reference_id', 'product_id', 'movement_type',
+                 unique=True,
+                 postgresql_where=db.text("movement_type IN ('sale_reservation', 'purchase')"),
+                 sqlite_where=db.text("movement_type IN ('sale_reservation', 'purchase')")),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
@@ -71,6 +99,11 @@ class StockMovement(db.Model):
 # Orders Service Models  
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        db.Index('ix_orders_status_created_at', 'status', 'created_at'),
+        db.Index('ix_orders_order_type', 'order_type'),
+        db.Index('ix_orders_created_at_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     order_number = db.Column(db.String(50), unique=True, nullable=False)
@@ -102,6 +135,9 @@ class Order(db.Model):
 
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
+    __table_args__ = (
+        db.Index('ix_order_items_order_id', 'order_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
@@ -126,3 +162,69 @@ class OrderItem(db.Model):
             'unit_price': float(self.unit_price),
             'total_price': float(self.total_price)
         }
+
+class OrderStats(db.Model):
+    """Order counters maintained incrementally on creation and status changes.
+
+    Each (status, order_type) counter is split over shard rows that writers
+    pick at random, so concurrent orders don't queue on one row lock;
+    readers sum the shards.
+    """
+    __tablename__ = 'order_stats'
+    
+    status = db.Column(db.Enum(OrderStatus), primary_key=True)
+    order_type = db.Column(db.Enum(OrderType), primary_key=True)
+    shard = db.Column(db.SmallInteger, primary_key=True, default=0, server_default='0')
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<OrderStats {self.status.value}/{self.order_type.value}#{self.shard}: {self.order_count}>'
+
+class OutboxEvent(db.Model):
+    __tablename__ = 'outbox_events'
+    __table_args__ = (
+        # Partial index over the relay's backlog; published rows drop out of it
+        db.Index('ix_outbox_events_pending', 'id',
+                 postgresql_where=db.text('published_at IS NULL'),
+                 sqlite_where=db.text('published_at IS NULL')),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(100), nullable=False)
+    event_key = db.Column(db.String(100))
+    payload = db.Column(db.JSON, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    published_at = db.Column(db.DateTime)  # NULL until relayed to Kafka
+    
+    def __repr__(self):
+        return f'<OutboxEvent {self.id}: {self.topic}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'topic': self.topic,
+            'event_key': self.event_key,
+            'payload': self.payload,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat(),
+            'published_at': self.published_at.isoformat() if self.published_at else None
+        }
+
+class IdempotencyKey(db.Model):
+    """Response of a request made with an Idempotency-Key header, replayed on retries"""
+    __tablename__ = 'idempotency_keys'
+    
+    key = db.Column(db.String(255), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of the request body
+    status_code = db.Column(db.Integer, nullable=False)
+    response = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key}>'
@@ -0,0 +1,139 @@
+import logging
+import os
+import random
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from shared.database import db
+from shared.models import Order, OrderStats, OrderStatus, OrderType
+
+logger = logging.getLogger(__name__)
+
+# Rows each counter is split over; more shards mean less lock contention between order writes
+ORDER_STATS_SHARDS = max(1, int(os.getenv('ORDER_STATS_SHARDS', '16')))
+
+def record_status_transitions(transitions):
+    """Apply order counter deltas in the caller's transaction.
+
+    transitions is an iterable of (order_type, old_status, new_status, amount)
+    tuples; old_status is None for newly created orders. Deltas are summed per
+    (status, order_type) and written with one upsert each to a random shard
+    row, so concurrent transactions rarely wait on each other. A transaction
+    uses one shard for all its rows and writes them in a fixed order, so
+    transactions can't deadlock on the counter rows.
+    """
+    deltas = defaultdict(lambda: [0, Decimal('0')])
+    for order_type, old_status, new_status, amount in transitions:
+        if old_status == new_status:
+            continue
+        amount = Decimal(str(amount or 0))
+        if old_status is not None:
+            deltas[(old_status, order_type)][0] -= 1
+            deltas[(old_status, order_type)][1] -= amount
+        if new_status is not None:
+            deltas[(new_status, order_type)][0] += 1
+            deltas[(new_status, order_type)][1] += amount
+
+    shard = random.randrange(ORDER_STATS_SHARDS)
+    for (status, order_type), (count, amount) in sorted(deltas.items(), key=lambda d: (d[0][0].value, d[0][1].value)):
+        if count or amount:
+            _upsert_delta(status, order_type, shard, count, amount)
+
+def record_order_created(order: Order):
+    """Count a new order in the caller's transaction"""
+    record_status_transitions([(order.order_type, None, order.status or OrderStatus.PENDING, order.total_amount)])
+
+def _upsert_delta(status: OrderStatus, order_type: OrderType, shard: int, count: int, amount: Decimal):
+    table = OrderStats.__table__
+    now = datetime.utcnow()
+    dialect = db.engine.dialect.name
+
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert(table).values(
+            status=status, order_type=order_type, shard=shard, order_count=count, total_amount=amount, updated_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.status, table.c.order_type, table.c.shard],
+            set_={
+                'order_count': table.c.order_count + stmt.excluded.order_count,
+                'total_amount': table.c.total_amount + stmt.excluded.total_amount,
+                'updated_at': now
+            }
+        )
+        db.session.execute(stmt)
+        return
+
+    updated = db.session.execute(
+        table.update()
+        .where(table.c.status == status, table.c.order_type == order_type, table.c.shard == shard)
+        .values(order_count=table.c.order_count + count, total_amount=table.c.total_amount + amount, updated_at=now)
+    )
+    if not updated.rowcount:
+        db.session.execute(table.insert().values(
+            status=status, order_type=order_type, shard=shard, order_count=count, total_amount=amount, updated_at=now
+        ))
+
+def aggregate_order_stats():
+    """Compute counters from the orders table with a single grouped query"""
+    rows = db.session.execute(
+        select(Order.status, Order.order_type, func.count(Order.id), func.coalesce(func.sum(Order.total_amount), 0))
+        .group_by(Order.status, Order.order_type)
+    ).all()
+    return [(status, order_type, count, amount) for status, order_type, count, amount in rows]
+
+def rebuild_order_stats():
+    """Recompute the maintained counters from the orders table"""
+    rows = aggregate_order_stats()
+    db.session.execute(OrderStats.__table__.delete())
+    db.session.add_all([
+        OrderStats(status=status, order_type=order_type, shard=0, order_count=count, total_amount=amount)
+        for status, order_type, count, amount in rows
+    ])
+    db.session.commit()
+    logger.info(f"Rebuilt order stats from {sum(row[2] for row in rows)} orders")
+    return rows
+
+def ensure_order_stats():
+    """Backfill the counters if they have never been built for existing orders"""
+    has_stats = db.session.execute(select(OrderStats.status).limit(1)).first()
+    has_orders = db.session.execute(select(Order.id).limit(1)).first()
+    if has_orders and not has_stats:
+        rebuild_order_stats()
+
+def get_order_stats(live: bool = False):
+    """Order statistics from the maintained counters (or live from orders).
+
+    The counters table holds at most ORDER_STATS_SHARDS rows per status and
+    order type, so reading it costs the same no matter how many orders exist.
+    """
+    if live:
+        rows = aggregate_order_stats()
+    else:
+        rows = db.session.execute(
+            select(
+                OrderStats.status, OrderStats.order_type,
+                func.sum(OrderStats.order_count), func.sum(OrderStats.total_amount)
+            )
+            .group_by(OrderStats.status, OrderStats.order_type)
+        ).all()
+
+    stats = {f'orders_{status.value}': 0 for status in OrderStatus}
+    stats.update({f'orders_{order_type.value}': 0 for order_type in OrderType})
+    stats['total_orders'] = 0
+    total_revenue = Decimal('0')
+
+    for status, order_type, count, amount in rows:
+        stats[f'orders_{status.value}'] += count
+        stats[f'orders_{order_type.value}'] += count
+        stats['total_orders'] += count
+        # Total revenue (completed orders only)
+        if status == OrderStatus.COMPLETED:
+            total_revenue += Decimal(str(amount))
+
+    stats['total_revenue'] = float(total_revenue)
+    return stats
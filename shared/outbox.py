@@ -0,0 +1,124 @@
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from shared.database import db
+from shared.models import OutboxEvent
+from shared.kafka_client import kafka_client
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '200'))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '0.5'))
+OUTBOX_RETENTION_HOURS = int(os.getenv('OUTBOX_RETENTION_HOURS', '24'))
+OUTBOX_PURGE_INTERVAL = 300  # seconds
+
+def add_outbox_event(topic: str, payload: dict, key: str = None):
+    """Stage an event in the current transaction; the relay publishes it after commit"""
+    event = OutboxEvent(topic=topic, event_key=key, payload=payload)
+    db.session.add(event)
+    return event
+
+def add_outbox_events(events: list):
+    """Stage many (topic, payload, key) events with one multi-row insert"""
+    if events:
+        now = datetime.utcnow()
+        db.session.execute(insert(OutboxEvent), [
+            {'topic': topic, 'event_key': key, 'payload': payload, 'attempts': 0, 'created_at': now}
+            for topic, payload, key in events
+        ])
+
+def relay_outbox_batch(batch_size: int = None):
+    """Publish one batch of pending outbox events to Kafka.
+
+    Rows are locked with SKIP LOCKED so several relays can run side by side.
+    An event is only marked as published once the broker acknowledged it,
+    which gives at-least-once delivery. Returns the number of events published.
+    """
+    batch_size = batch_size or OUTBOX_BATCH_SIZE
+
+    try:
+        events = (
+            OutboxEvent.query
+            .filter(OutboxEvent.published_at.is_(None))
+            .order_by(OutboxEvent.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        if not events:
+            db.session.commit()
+            return 0
+
+        results = kafka_client.send_batch([
+            (event.topic, event.payload, event.event_key) for event in events
+        ])
+
+        published = 0
+        now = datetime.utcnow()
+        for event, delivered in zip(events, results):
+            if delivered:
+                event.published_at = now
+                published += 1
+            else:
+                event.attempts += 1
+                event.last_error = 'Delivery not acknowledged by broker'
+
+        db.session.commit()
+
+        if published < len(events):
+            logger.warning(f"Outbox relay published {published}/{len(events)} events")
+        return published
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error relaying outbox events: {e}")
+        return 0
+
+def purge_published_events(retention_hours: int = None):
+    """Delete events that were published longer ago than the retention window"""
+    retention_hours = retention_hours or OUTBOX_RETENTION_HOURS
+    cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
+
+    try:
+        deleted = (
+            OutboxEvent.query
+            .filter(OutboxEvent.published_at.isnot(None), OutboxEvent.published_at < cutoff)
+            .delete(synchronize_session=False)
+        )
+        db.session.commit()
+        if deleted:
+            logger.info(f"Purged {deleted} published outbox events")
+        return deleted
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error purging outbox events: {e}")
+        return 0
+
+def start_outbox_relay_with_app(app):
+    """Start the outbox relay loop with Flask app context"""
+    def relay_with_context():
+        logger.info("Starting outbox relay")
+        last_purge = 0
+
+        while True:
+            try:
+                with app.app_context():
+                    published = relay_outbox_batch()
+
+                    if time.time() - last_purge > OUTBOX_PURGE_INTERVAL:
+                        purge_published_events()
+                        last_purge = time.time()
+
+                # Keep draining while there is a backlog, otherwise wait
+                if published == 0:
+                    time.sleep(OUTBOX_POLL_INTERVAL)
+
+            except Exception as e:
+                logger.error(f"Error in outbox relay loop: {e}")
+                time.sleep(OUTBOX_POLL_INTERVAL)
+
+    return relay_with_context
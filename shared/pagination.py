@@ -0,0 +1,59 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import text
+
+from shared.database import db
+
+MAX_PAGE_SIZE = 500
+COUNT_MODES = ('exact', 'estimated', 'none')
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(*values) -> str:
+    """Encode the sort key of the last row of a page as an opaque cursor"""
+    payload = [
+        value.isoformat() if isinstance(value, datetime) else str(value) if isinstance(value, Decimal) else value
+        for value in values
+    ]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str, *types) -> tuple:
+    """Decode a cursor produced by encode_cursor, converting each value to the given type"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        if len(values) != len(types):
+            raise ValueError('cursor has the wrong number of values')
+        return tuple(
+            datetime.fromisoformat(value) if value_type is datetime else value_type(value)
+            for value, value_type in zip(values, types)
+        )
+    except Exception as e:
+        raise InvalidCursor(f'Invalid cursor: {cursor}') from e
+
+def clamp_limit(limit: int, default: int = 50) -> int:
+    """Keep page sizes between 1 and MAX_PAGE_SIZE"""
+    if not limit or limit < 1:
+        return default
+    return min(limit, MAX_PAGE_SIZE)
+
+def count_rows(query, mode: str = 'estimated'):
+    """Count the rows matched by a query.
+
+    'exact' runs COUNT(*), 'estimated' reads the planner's row estimate
+    (PostgreSQL only, exact elsewhere) and 'none' skips counting. Returns a
+    (total, is_estimate) tuple; total is None when counting is skipped.
+    """
+    if mode == 'none':
+        return None, False
+
+    query = query.order_by(None)
+    if mode == 'estimated' and db.engine.dialect.name == 'postgresql':
+        sql = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+        plan = db.session.execute(text(f'EXPLAIN (FORMAT JSON) {sql}')).scalar()
+        return int(plan[0]['Plan']['Plan Rows']), True
+
+    return query.count(), False
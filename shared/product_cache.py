@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+from shared.database import REPLICA_BIND, db
+from shared.models import Product
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_CACHE_TTL = int(os.getenv('PRODUCT_CACHE_TTL', '60'))  # seconds
+PRODUCT_CACHE_SIZE = int(os.getenv('PRODUCT_CACHE_SIZE', '10000'))  # entries, in-process cache only
+PRODUCT_CACHE_TIMEOUT = float(os.getenv('PRODUCT_CACHE_TIMEOUT', '0.2'))  # seconds per Redis call
+PRODUCT_CACHE_RETRY_INTERVAL = float(os.getenv('PRODUCT_CACHE_RETRY_INTERVAL', '5'))  # seconds
+
+class LocalCacheBackend:
+    """Entries in process memory, expiring after ttl and evicted least recently used first.
+
+    Only writes made by this process invalidate its entries; other processes'
+    writes are picked up when the entries expire.
+    """
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._generations = {}  # key -> number of invalidations
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """(value or None, generation)"""
+        with self._lock:
+            generation = self._generations.get(key, 0)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, generation
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None, generation
+            self._entries.move_to_end(key)
+            return entry[1], generation
+
+    def set(self, key, value: dict, generation) -> bool:
+        """Store value unless key was invalidated since generation was read"""
+        with self._lock:
+            if self._generations.get(key, 0) != generation:
+                return False
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def delete(self, keys: list):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+class RedisCacheBackend:
+    """Entries in Redis with a TTL, shared by every process of every service.
+
+    Each key has a generation counter next to it that invalidations bump;
+    set() is a WATCH/MULTI transaction that only writes if the counter is
+    unchanged. Counters expire like entries, after the cache TTL.
+    """
+
+    def __init__(self, url: str, ttl: int, prefix: str = 'product:'):
+        self.redis = redis.Redis.from_url(
+            url,
+            socket_timeout=PRODUCT_CACHE_TIMEOUT,
+            socket_connect_timeout=PRODUCT_CACHE_TIMEOUT
+        )
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, key) -> str:
+        return f'{self.prefix}{key}'
+
+    def _generation_key(self, key) -> str:
+        return f'{self.prefix}generation:{key}'
+
+    def get(self, key):
+        """(value or None, generation), in one round trip"""
+        value, generation = self.redis.mget(self._key(key), self._generation_key(key))
+        return (json.loads(value) if value is not None else None), generation
+
+    def set(self, key, value: dict, generation) -> bool:
+        """Store value unless key was invalidated since generation was read"""
+        generation_key = self._generation_key(key)
+        with self.redis.pipeline() as pipe:
+            try:
+                pipe.watch(generation_key)
+                if pipe.get(generation_key) != generation:
+                    return False
+                pipe.multi()
+                pipe.set(self._key(key), json.dumps(value), ex=self.ttl)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def delete(self, keys: list):
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.incr(self._generation_key(key))
+            pipe.expire(self._generation_key(key), self.ttl)
+        pipe.delete(*(self._key(key) for key in keys))
+        pipe.execute()
+
+class ProductCache:
+    """Read-through cache of Product.to_dict() keyed by product id.
+
+    Misses and cache errors fall through to the database. A miss only fills
+    the cache if the product wasn't invalidated while it was being loaded,
+    so a read that raced with a write can't cache the old row. After an error,
+    reads skip the cache for PRODUCT_CACHE_RETRY_INTERVAL seconds so an
+    unavailable Redis costs one timeout instead of one per request.
+    Invalidations are always attempted; an entry whose invalidation failed
+    expires after PRODUCT_CACHE_TTL.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._skip_until = 0.0
+
+    def _call(self, operation, *args):
+        try:
+            return operation(*args)
+        except Exception as e:
+            self._skip_until = time.monotonic() + PRODUCT_CACHE_RETRY_INTERVAL
+            logger.warning(f"Product cache unavailable, using the database: {e}")
+            return None
+
+    def _available(self) -> bool:
+        return time.monotonic() >= self._skip_until
+
+    def get_product(self, product_id: int):
+        """Product dict, or None if the product doesn't exist"""
+        # The generation is read with the entry, before the database, so an
+        # invalidation that lands while the row is loaded blocks the fill
+        result = self._call(self.backend.get, product_id) if self._available() else None
+        if result is not None and result[0] is not None:
+            return result[0]
+
+        product = Product.query.get(product_id)
+        if not product:
+            return None
+
+        # Rows read from a lagging replica are served but not cached
+        product_data = product.to_dict()
+        if result is not None and self._available() and not db.session.info.get(REPLICA_BIND):
+            self._call(self.backend.set, product_id, product_data, result[1])
+        return product_data
+
+    def invalidate(self, *product_ids):
+        """Drop cached products; call after the write that changed them commits"""
+        if product_ids:
+            self._call(self.backend.delete, list(product_ids))
+
+def create_product_cache():
+    """Redis-backed cache when REDIS_URL is set, otherwise in-process memory"""
+    redis_url = os.getenv('REDIS_URL')
+    if redis_url:
+        if redis is None:
+            logger.warning("REDIS_URL is set but the redis package is not installed, caching products in memory")
+        else:
+            return ProductCache(RedisCacheBackend(redis_url, PRODUCT_CACHE_TTL))
+    return ProductCache(LocalCacheBackend(PRODUCT_CACHE_TTL, PRODUCT_CACHE_SIZE))
+
+product_cache = create_product_cache()
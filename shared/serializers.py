@@ -0,0 +1,48 @@
+"""Column-level serializers.
+
+List endpoints select exactly the columns of a model's to_dict() and turn
+the rows into dicts without hydrating ORM objects. Values stay as the
+database returned them (datetimes, Decimals, enums); the app's JSON
+provider (shared.json_provider) encodes them the same way to_dict() would.
+"""
+from collections import defaultdict
+
+from sqlalchemy import select
+
+from shared.database import db
+from shared.models import Order, OrderItem, Product, StockMovement
+
+def fields(model, names: list) -> tuple:
+    """Column attributes of a model, labelled with their to_dict() keys"""
+    return tuple(getattr(model, name) for name in names)
+
+ORDER_FIELDS = fields(Order, [
+    'id', 'order_number', 'order_type', 'status', 'customer_name', 'customer_email',
+    'total_amount', 'created_at', 'updated_at', 'processed_at'
+])
+ORDER_ITEM_FIELDS = fields(OrderItem, [
+    'id', 'order_id', 'product_id', 'product_name', 'quantity', 'unit_price', 'total_price'
+])
+PRODUCT_FIELDS = fields(Product, [
+    'id', 'name', 'description', 'price', 'stock_quantity', 'min_stock_level', 'created_at', 'updated_at'
+])
+STOCK_MOVEMENT_FIELDS = fields(StockMovement, [
+    'id', 'product_id', 'quantity_change', 'movement_type', 'reference_id', 'notes', 'created_at'
+])
+
+def row_dicts(rows) -> list:
+    """Rows selected with one of the *_FIELDS tuples as dicts"""
+    return [row._asdict() for row in rows]
+
+def order_items_by_order(order_ids: list) -> dict:
+    """Item dicts of many orders with one query, keyed by order id"""
+    items = defaultdict(list)
+    if order_ids:
+        rows = db.session.execute(
+            select(*ORDER_ITEM_FIELDS)
+            .where(OrderItem.order_id.in_(order_ids))
+            .order_by(OrderItem.id)
+        )
+        for row in rows:
+            items[row.order_id].append(row._asdict())
+    return items
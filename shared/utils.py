@@ -1,6 +1,13 @@
+import atexit
+import os
+import queue
+import threading
 import uuid
 import logging
-from datetime import datetime
+from collections import defaultdict
+from logging.handlers import QueueHandler, QueueListener
+from datetime import datetime, timezone
+from decimal import Decimal
 from functools import wraps
 from flask import request, jsonify
 
@@ -10,18 +17,124 @@ def generate_order_number():
     unique_id = str(uuid.uuid4())[:8].upper()
     return f"ORD-{timestamp}-{unique_id}"
 
+# Extra marker for log records that carry full message payloads; these are
+# sampled so hot consumer paths don't format and write every event
+PAYLOAD = {'payload': True}
+
+_log_listener = None
+_log_sampler = None
+
+class LazyQueueHandler(QueueHandler):
+    """Queue handler that leaves formatting to the background listener thread"""
+
+    def prepare(self, record):
+        # The queue never leaves the process, so the record doesn't need to be
+        # made picklable; formatting happens in the listener thread
+        return record
+
+class LogSampler(logging.Filter):
+    """Per-logger payload sampling and rate limiting.
+
+    WARNING and above always pass. Records marked with PAYLOAD are kept once
+    every 1/sample_rate records, and lower-level records are capped at
+    rate_limit per second per logger (0 disables the cap).
+    """
+
+    def __init__(self, sample_rate: float = 1.0, rate_limit: int = 0):
+        super().__init__()
+        self.defaults = (sample_rate, rate_limit)
+        self.overrides = {}
+        self._payload_counters = defaultdict(int)
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def configure(self, logger_name: str, sample_rate: float = None, rate_limit: int = None):
+        default_rate, default_limit = self.overrides.get(logger_name, self.defaults)
+        self.overrides[logger_name] = (
+            default_rate if sample_rate is None else sample_rate,
+            default_limit if rate_limit is None else rate_limit
+        )
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+
+        sample_rate, rate_limit = self.overrides.get(record.name, self.defaults)
+
+        with self._lock:
+            if getattr(record, 'payload', False) and sample_rate < 1.0:
+                if sample_rate <= 0:
+                    return False
+                count = self._payload_counters[record.name]
+                self._payload_counters[record.name] = count + 1
+                if count % max(int(round(1 / sample_rate)), 1):
+                    return False
+
+            if rate_limit:
+                second = int(record.created)
+                window_start, count = self._windows.get(record.name, (second, 0))
+                if window_start != second:
+                    window_start, count = second, 0
+                if count >= rate_limit:
+                    self._windows[record.name] = (window_start, count)
+                    return False
+                self._windows[record.name] = (window_start, count + 1)
+
+        return True
+
 def setup_logging(service_name: str):
-    """Setup logging configuration"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format=f'%(asctime)s - {service_name} - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(f'/app/logs/{service_name}.log'),
+    """Setup logging configuration.
+
+    Records are put on an in-memory queue and written to the log file and
+    stderr by a background listener thread, so request and consumer threads
+    never block on formatting or disk I/O.
+    """
+    global _log_listener, _log_sampler
+    
+    if _log_listener is None and not logging.getLogger().handlers:
+        log_dir = os.getenv('LOG_DIR', '/app/logs')
+        os.makedirs(log_dir, exist_ok=True)
+        
+        formatter = logging.Formatter(f'%(asctime)s - {service_name} - %(levelname)s - %(message)s')
+        handlers = [
+            logging.FileHandler(os.path.join(log_dir, f'{service_name}.log')),
             logging.StreamHandler()
         ]
-    )
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        
+        _log_sampler = LogSampler(
+            sample_rate=float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '0.01')),
+            rate_limit=int(os.getenv('LOG_RATE_LIMIT', '0'))
+        )
+        # Per-logger overrides: "logger-name=sample_rate[:rate_limit],..."
+        for override in filter(None, os.getenv('LOG_SAMPLING_OVERRIDES', '').split(',')):
+            name, _, settings = override.partition('=')
+            sample_rate, _, rate_limit = settings.partition(':')
+            _log_sampler.configure(
+                name.strip(),
+                float(sample_rate) if sample_rate else None,
+                int(rate_limit) if rate_limit else None
+            )
+        
+        queue_handler = LazyQueueHandler(queue.SimpleQueue())
+        queue_handler.addFilter(_log_sampler)
+        
+        _log_listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        _log_listener.start()
+        atexit.register(_log_listener.stop)
+        
+        logging.basicConfig(
+            level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+            handlers=[queue_handler]
+        )
     return logging.getLogger(service_name)
 
+def configure_log_sampling(logger_name: str, sample_rate: float = None, rate_limit: int = None):
+    """Override payload sample rate and/or rate limit for a single logger"""
+    if _log_sampler:
+        _log_sampler.configure(logger_name, sample_rate, rate_limit)
+
 def validate_json(*required_fields):
     """Decorator to validate JSON request data"""
     def decorator(f):
@@ -48,6 +161,41 @@ def validate_json(*required_fields):
         return decorated_function
     return decorator
 
+def parse_datetime_param(name: str):
+    """Parse an ISO 8601 date or datetime query parameter; None when absent.
+
+    Returns a naive UTC datetime, like the stored datetime.utcnow() values:
+    values with an offset are converted to UTC, naive values are taken as
+    UTC already. Raises ValueError with a message for the client on
+    malformed input.
+    """
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f'Invalid {name}: {value} (expected ISO 8601 date or datetime)')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def parse_number_param(name: str, number_type=int):
+    """Parse an int (or Decimal, float) query parameter; None when absent.
+
+    Raises ValueError with a message for the client on malformed input.
+    """
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        number = number_type(value)
+    except (ValueError, ArithmeticError):
+        number = None
+    if number is None or (isinstance(number, Decimal) and not number.is_finite()):
+        raise ValueError(f'Invalid {name}: {value} (expected a number)')
+    return number
+
 def health_check_response(service_name: str, status: str = "healthy", additional_info: dict = None):
     """Generate standardized health check response"""
     response = {